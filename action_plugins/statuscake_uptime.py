@@ -0,0 +1,180 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+# Merge the statuscake_uptime (or statuscake_ssl) tasks of every host of the
+# current batch into a single run of the module with the tests option, so the
+# account test list is fetched once instead of once per host.
+#
+# The first worker that takes the task lock renders the task arguments for
+# every host of ansible_play_batch, runs the module once per account (and
+# cache settings) and stores the result of each host in the local temporary
+# directory. The other workers wait for the lock and pick their own result.
+# Hosts that can't be merged (loops, state=list, tests option, failed batch)
+# run the module on their own as usual. Set statuscake_merge_hosts to false
+# to disable the merge.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import fcntl
+import hashlib
+import json
+import os
+
+from ansible import constants as C
+from ansible.parsing.mod_args import ModuleArgsParser
+from ansible.plugins.action import ActionBase
+from ansible.template import Templar
+from ansible.utils.display import Display
+
+display = Display()
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+
+    MERGED_STATES = ('present', 'absent')
+    ACCOUNT_PARAMS = ('username', 'api_key', 'cache_dir', 'cache_ttl',
+                      'account_concurrency', 'mirror', 'fingerprint_ttl',
+                      'connect_timeout', 'read_timeout', 'trust_list',
+                      'concurrency', 'rate_limit', 'max_retries', 'metrics',
+                      'offline', 'snapshot', 'exclusive', 'exclusive_tag',
+                      'exclusive_prefix', 'max_deletes')
+    # results of a merged run that are not specific to a host
+    BATCH_KEYS = ('api_calls', 'throttled_time', 'metrics', 'pruned')
+
+    def run(self, tmp=None, task_vars=None):
+        if task_vars is None:
+            task_vars = dict()
+
+        result = super(ActionModule, self).run(tmp, task_vars)
+
+        batch = task_vars.get('ansible_play_batch') or []
+        host = task_vars.get('inventory_hostname')
+
+        if not self.mergeable(self._task.args) or len(batch) < 2 or \
+                host not in batch or self._task.loop or \
+                not task_vars.get('statuscake_merge_hosts', True):
+            result.update(self._execute_module(module_args=self._task.args,
+                                               task_vars=task_vars))
+            return result
+
+        results = self.batch_results(batch, task_vars)
+
+        if host in results:
+            result.update(results[host])
+        else:
+            result.update(self._execute_module(module_args=self._task.args,
+                                               task_vars=task_vars))
+        return result
+
+    def mergeable(self, args):
+        return (args.get('state', 'present') in self.MERGED_STATES and
+                not args.get('tests') and not args.get('accounts'))
+
+    # results of the whole batch, computed by the first worker that gets the
+    # lock and shared with the others through the local temporary directory
+    def batch_results(self, batch, task_vars):
+        batch_id = hashlib.sha1(
+            ','.join(sorted(batch)).encode('utf-8')).hexdigest()
+        path = os.path.join(C.DEFAULT_LOCAL_TMP, 'statuscake-%s-%s' %
+                            (self._task._uuid, batch_id))
+
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(path + '.json'):
+                    with open(path + '.json') as f:
+                        return json.load(f)
+
+                results = self.run_batch(batch, task_vars)
+
+                with open(path + '.tmp', 'w') as f:
+                    json.dump(results, f)
+                os.rename(path + '.tmp', path + '.json')
+                return results
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def run_batch(self, batch, task_vars):
+        groups = {}
+        current = task_vars.get('inventory_hostname')
+
+        for host in batch:
+            if host == current:
+                args = self._task.args
+            else:
+                args = self.host_args(host, task_vars)
+            if args is None:
+                continue
+            if not self.mergeable(args):
+                display.vvv('statuscake: {0} not merged, its arguments '
+                            'need a run of their own'.format(host))
+                continue
+
+            account = tuple(args.get(k) for k in self.ACCOUNT_PARAMS)
+            item = dict((k, v) for k, v in args.items()
+                        if k not in self.ACCOUNT_PARAMS)
+            groups.setdefault(account, []).append((host, item))
+
+        results = {}
+        for account, items in groups.items():
+            module_args = dict((k, v) for k, v in
+                               zip(self.ACCOUNT_PARAMS, account)
+                               if v is not None)
+            module_args['tests'] = [item for host, item in items]
+
+            bulk = self._execute_module(module_args=module_args,
+                                        task_vars=task_vars)
+            if bulk.get('failed') or \
+                    len(bulk.get('results', [])) != len(items):
+                continue
+
+            for (host, item), test in zip(items, bulk['results']):
+                results[host] = test
+            # the usage and the pruned tests of the merged run are reported
+            # once, by its first host
+            first = results[items[0][0]]
+            first.update((k, bulk[k]) for k in self.BATCH_KEYS if k in bulk)
+            if bulk.get('pruned'):
+                first['changed'] = True
+        return results
+
+    # task arguments rendered with the variables of another host of the
+    # batch, or None when the task is skipped for this host or can't be
+    # rendered (the host then runs the module on its own)
+    def host_args(self, host, task_vars):
+        try:
+            # the same variables as the worker of that host gets (play vars,
+            # role and block vars, facts, magic vars), not only its hostvars
+            hostvars = task_vars['hostvars']
+            host_vars = hostvars._variable_manager.get_vars(
+                play=self._task.get_play(),
+                host=hostvars._inventory.get_host(host), task=self._task)
+            templar = Templar(loader=self._loader, variables=host_vars)
+
+            if not self._task.evaluate_conditional(templar, host_vars):
+                display.vvv('statuscake: {0} not merged, the task is '
+                            'skipped for it'.format(host))
+                return None
+
+            action, args, delegate_to = \
+                ModuleArgsParser(task_ds=self._task._ds).parse()
+            return templar.template(args)
+        except Exception as e:
+            display.vvv('statuscake: {0} not merged, its arguments could not '
+                        'be rendered: {1}'.format(host, e))
+            return None
@@ -0,0 +1,361 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+# Local stand-in of the StatusCake API used by the benchmarks. It serves
+# /API/Tests, /API/Tests/Details, /API/Tests/Update, /API/SSL,
+# /API/SSL/Update and /API/ContactGroups for an account of any size, with
+# optional latency and throttled (HTTP 429) responses, and counts the calls
+# and bytes per endpoint. GET /_stats returns the counters, POST /_reset clears them.
+#
+# Run it on its own with: python benchmarks/fake_api.py --tests 1000
+
+import argparse
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# form fields of /API/Tests/Update -> field of the test details
+UPTIME_FIELDS = {'WebsiteName': 'WebsiteName',
+                 'WebsiteURL': 'URI',
+                 'CheckRate': 'CheckRate',
+                 'TestType': 'TestType',
+                 'TestTags': 'Tags',
+                 'ContactGroup': 'ContactGroups',
+                 'Paused': 'Paused',
+                 'NodeLocations': 'NodeLocations',
+                 'Confirmation': 'Confirmation',
+                 'Timeout': 'Timeout',
+                 'StatusCodes': 'StatusCodes',
+                 'WebsiteHost': 'WebsiteHost',
+                 'FollowRedirect': 'FollowRedirect',
+                 'FindString': 'FindString',
+                 'Port': 'Port',
+                 'DoNotFind': 'DoNotFind',
+                 'TriggerRate': 'TriggerRate',
+                 'BasicUser': 'BasicUser',
+                 'CustomHeader': 'CustomHeader',
+                 'PostRaw': 'PostRaw'}
+
+UPTIME_INTS = ('CheckRate', 'Confirmation', 'Timeout', 'Port', 'TriggerRate')
+UPTIME_BOOLS = ('Paused', 'FollowRedirect', 'DoNotFind')
+UPTIME_LISTS = ('Tags', 'NodeLocations')
+
+SSL_FIELDS = ('domain', 'checkrate', 'contact_groups', 'alert_at',
+              'alert_expiry', 'alert_reminder', 'alert_broken', 'alert_mixed')
+
+
+def to_bool(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+class FakeStatusCake:
+
+    def __init__(self, tests=100, ssl_tests=10, latency=0.0,
+                 throttle_every=0):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.tests = OrderedDict()
+        # BasicPass is write-only, it is never returned by the API
+        self.passwords = {}
+        self.ssl = OrderedDict()
+        self.reset()
+
+        for i in range(tests):
+            self.add_test({'WebsiteName': 'bench-%d' % i,
+                           'WebsiteURL': 'https://bench-%d.example.com' % i,
+                           'TestTags': 'bench,group-%d' % (i % 10)})
+        for i in range(ssl_tests):
+            self.add_ssl({'domain': 'https://bench-%d.example.com' % i,
+                          'contact_groups': '1'})
+
+    def reset(self):
+        self.requests = 0
+        self.calls = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.throttled = 0
+
+    def stats(self):
+        return {'requests': self.requests,
+                'calls': dict(self.calls),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'throttled': self.throttled}
+
+    def new_id(self):
+        test_id = self.next_id
+        self.next_id += 1
+        return test_id
+
+    def add_test(self, form):
+        test_id = self.new_id()
+        self.tests[test_id] = {
+            'TestID': test_id, 'TestType': 'HTTP', 'Paused': False,
+            'WebsiteName': '', 'URI': '', 'ContactGroups': [],
+            'ContactGroup': None, 'ContactID': 0, 'Status': 'Up',
+            'Uptime': 100, 'Tags': [], 'CheckRate': 300, 'Timeout': 30,
+            'Confirmation': 0, 'FindString': '', 'DoNotFind': False,
+            'WebsiteHost': '', 'NodeLocations': [], 'StatusCodes': '',
+            'FollowRedirect': False, 'TriggerRate': 5, 'CustomHeader': '',
+            'PostRaw': '', 'Port': 0, 'BasicUser': '', 'Public': 0}
+        self.update_test(test_id, form)
+        return test_id
+
+    # apply the fields of an update form and tell if anything changed
+    def update_test(self, test_id, form):
+        test = self.tests[test_id]
+        before = json.dumps(test, sort_keys=True)
+        password = self.passwords.get(test_id)
+        if 'BasicPass' in form:
+            self.passwords[test_id] = form['BasicPass']
+        for name, value in form.items():
+            field = UPTIME_FIELDS.get(name)
+            if field is None:
+                continue
+            if field == 'ContactGroups':
+                test['ContactGroups'] = [{'ID': int(i), 'Name': 'group-%s' % i}
+                                         for i in value.split(',')
+                                         if i and i != '0']
+                test['ContactGroup'] = (test['ContactGroups'][0]['Name']
+                                        if test['ContactGroups'] else None)
+            elif field in UPTIME_INTS:
+                test[field] = int(value)
+            elif field in UPTIME_BOOLS:
+                test[field] = to_bool(value)
+            elif field in UPTIME_LISTS:
+                test[field] = [v.strip() for v in value.split(',')
+                               if v.strip()]
+            else:
+                test[field] = value
+        return json.dumps(test, sort_keys=True) != before or \
+            self.passwords.get(test_id) != password
+
+    def list_record(self, test):
+        return {'TestID': test['TestID'],
+                'Paused': test['Paused'],
+                'TestType': test['TestType'],
+                'WebsiteName': test['WebsiteName'],
+                'WebsiteURL': test['URI'],
+                'ContactGroup': [str(g['ID']) for g in test['ContactGroups']],
+                'ContactID': test['ContactID'],
+                'Status': test['Status'],
+                'Uptime': test['Uptime'],
+                'CheckRate': test['CheckRate'],
+                'Public': test['Public'],
+                'NormalisedResponse': 0,
+                'TestTags': test['Tags']}
+
+    def add_ssl(self, form):
+        test_id = self.new_id()
+        self.ssl[test_id] = {
+            'id': str(test_id), 'domain': '', 'checkrate': 3600,
+            'contact_groups': [], 'alert_at': '1,7,30', 'alert_expiry': True,
+            'alert_reminder': True, 'alert_broken': True,
+            'alert_mixed': True, 'paused': False, 'issuer_cn': 'Bench CA',
+            'cert_status': 'CERT_OK', 'cert_score': '95',
+            'valid_until_utc': '2030-01-01 00:00:00'}
+        self.update_ssl(test_id, form)
+        return test_id
+
+    def update_ssl(self, test_id, form):
+        test = self.ssl[test_id]
+        before = json.dumps(test, sort_keys=True)
+        for name in SSL_FIELDS:
+            if name not in form:
+                continue
+            value = form[name]
+            if name == 'checkrate':
+                test[name] = int(value)
+            elif name == 'contact_groups':
+                test[name] = [v for v in value.split(',') if v]
+            elif name.startswith('alert_') and name != 'alert_at':
+                test[name] = to_bool(value)
+            else:
+                test[name] = value
+        return json.dumps(test, sort_keys=True) != before
+
+    # (status, headers, body) of a request
+    def handle(self, method, path, query, form):
+        if method == 'GET' and path == '/API/Tests':
+            return 200, [self.list_record(t) for t in self.tests.values()]
+
+        if method == 'GET' and path.rstrip('/') == '/API/Tests/Details':
+            test = self.tests.get(int(query.get('TestID', 0)))
+            if not test:
+                return 200, {'ErrNo': 0, 'Error': 'No results found'}
+            return 200, test
+
+        if method == 'PUT' and path == '/API/Tests/Update':
+            if 'TestID' in form:
+                test_id = int(form['TestID'])
+                if test_id not in self.tests:
+                    return 200, {'Success': False, 'Message': 'Not found',
+                                 'Issues': {'TestID': 'unknown'}}
+                if not self.update_test(test_id, form):
+                    return 200, {'Success': False,
+                                 'Message': 'No data has been updated '
+                                            '(is any data different?) '
+                                            'Given: %d' % test_id}
+                return 200, {'Success': True, 'Message': 'Test updated'}
+            test_id = self.add_test(form)
+            return 200, {'Success': True, 'Message': 'Test Inserted',
+                         'InsertID': test_id}
+
+        if method == 'DELETE' and path.rstrip('/') == '/API/Tests/Details':
+            test_id = int(form.get('TestID') or query.get('TestID', 0))
+            if self.tests.pop(test_id, None) is None:
+                return 200, {'Success': False, 'Message': 'Not found'}
+            return 200, {'Success': True,
+                         'Message': 'This Check Has Been Deleted. '
+                                    'It can not be recovered.'}
+
+        if method == 'GET' and path == '/API/ContactGroups':
+            return 200, [{'GroupName': 'group-%d' % i, 'ContactID': i,
+                          'Emails': ['ops@example.com'], 'Mobiles': [],
+                          'Boxcar': '', 'Pushover': '', 'PingURL': '',
+                          'DesktopAlert': 0} for i in range(1, 4)]
+
+        if method == 'GET' and path == '/API/SSL':
+            return 200, list(self.ssl.values())
+
+        if method == 'PUT' and path == '/API/SSL/Update':
+            if 'id' in form:
+                test_id = int(form['id'])
+                if test_id not in self.ssl:
+                    return 200, {'Success': False, 'Message': 'Not found'}
+                self.update_ssl(test_id, form)
+                return 200, {'Success': True,
+                             'Message': 'SSL test has been updated '
+                                        'successfully'}
+            test_id = self.add_ssl(form)
+            return 200, {'Success': True, 'Message': test_id}
+
+        if method == 'DELETE' and path == '/API/SSL/Update':
+            test_id = int(query.get('id', 0))
+            if self.ssl.pop(test_id, None) is None:
+                return 200, {'Success': False, 'Message': 'Not found'}
+            return 200, {'Success': True, 'Message': 'Deletion successful'}
+
+        return 404, {'Success': False, 'Message': 'Unknown endpoint'}
+
+    def server(self, host='127.0.0.1', port=0):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written apart, do not let Nagle delay
+            # the body of keep-alive responses
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body, headers=()):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for header in headers:
+                    self.send_header(*header)
+                self.end_headers()
+                self.wfile.write(data)
+                return len(data)
+
+            def dispatch(self, method):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8')
+
+                if url.path == '/_stats':
+                    with api.lock:
+                        return self.reply(200, api.stats())
+                if url.path == '/_reset':
+                    with api.lock:
+                        api.reset()
+                    return self.reply(200, {})
+
+                query = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+                form = dict((k, v[-1]) for k, v in
+                            parse_qs(body, keep_blank_values=True).items())
+                endpoint = method + ' ' + url.path.rstrip('/')
+
+                with api.lock:
+                    api.requests += 1
+                    api.calls[endpoint] += 1
+                    api.bytes_in += length + len(self.requestline)
+                    throttled = (api.throttle_every and
+                                 api.requests % api.throttle_every == 0)
+                    if throttled:
+                        api.throttled += 1
+                    else:
+                        status, response = api.handle(method, url.path,
+                                                      query, form)
+
+                if api.latency:
+                    time.sleep(api.latency)
+
+                if throttled:
+                    size = self.reply(429, {'Success': False,
+                                            'Message': 'Too many requests'},
+                                      [('Retry-After', '0')])
+                else:
+                    size = self.reply(status, response)
+                with api.lock:
+                    api.bytes_out += size
+
+            def do_GET(self):
+                self.dispatch('GET')
+
+            def do_PUT(self):
+                self.dispatch('PUT')
+
+            def do_POST(self):
+                self.dispatch('POST')
+
+            def do_DELETE(self):
+                self.dispatch('DELETE')
+
+        return ThreadingHTTPServer((host, port), Handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in of the StatusCake API")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--tests', type=int, default=100,
+                        help="number of uptime tests of the account")
+    parser.add_argument('--ssl-tests', type=int, default=10,
+                        help="number of SSL tests of the account")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="latency added to every response, in ms")
+    parser.add_argument('--throttle-every', type=int, default=0,
+                        help="answer every Nth request with HTTP 429")
+    args = parser.parse_args()
+
+    api = FakeStatusCake(args.tests, args.ssl_tests, args.latency / 1000.0,
+                         args.throttle_every)
+    server = api.server(port=args.port)
+    print("Fake StatusCake API listening on http://127.0.0.1:%d" %
+          server.server_address[1])
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmarks of the statuscake_uptime and statuscake_ssl modules against the
+# local fake StatusCake API of benchmarks/fake_api.py, run in a separate
+# process. Every scenario reports its wall time, the number of HTTP calls
+# and bytes seen by the fake API and the peak memory of the module code.
+#
+# Requires ansible. Example:
+#   python benchmarks/run.py --sizes 100,1000,10000 --managed 100 --latency 50
+
+import argparse
+import importlib.util
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from urllib.request import Request, urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ansible.module_utils  # noqa: E402
+ansible.module_utils.__path__.append(os.path.join(ROOT, 'module_utils'))
+
+from ansible.module_utils.parsing.convert_bool import boolean  # noqa: E402
+from ansible.module_utils.statuscake import (StatusCakeClient,  # noqa: E402
+                                              TestSelector)
+from fake_api import FakeStatusCake  # noqa: E402
+
+
+def load_module(name):
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(ROOT, 'library', name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+uptime = load_module('statuscake_uptime')
+ssl = load_module('statuscake_ssl')
+
+
+# the part of AnsibleModule used by the module classes
+class BenchModule:
+
+    def __init__(self, check_mode=False):
+        self.check_mode = check_mode
+        self.warnings = []
+
+    def fail_json(self, **kwargs):
+        raise RuntimeError(kwargs.get('msg'))
+
+    def warn(self, msg):
+        self.warnings.append(msg)
+
+    def boolean(self, value):
+        return boolean(value)
+
+
+def serve(api_args, port_queue):
+    server = FakeStatusCake(*api_args).server()
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class FakeServer:
+
+    def __init__(self, tests, ssl_tests, latency, throttle_every):
+        queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=serve, args=((tests, ssl_tests, latency, throttle_every),
+                                queue))
+        self.process.daemon = True
+        self.process.start()
+        self.url = "http://127.0.0.1:%d" % queue.get(timeout=60)
+
+    def control(self, path):
+        method = 'POST' if path == '/_reset' else 'GET'
+        with urlopen(Request(self.url + path, method=method)) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+
+def point_to(url):
+    uptime.StatusCakeUptime.URL_ALL_TESTS = url + "/API/Tests"
+    uptime.StatusCakeUptime.URL_DETAILS_TEST = url + "/API/Tests/Details"
+    uptime.StatusCakeUptime.URL_UPDATE_TEST = url + "/API/Tests/Update"
+    ssl.StatusCakeSSL.URL_ALL_TESTS = url + "/API/SSL"
+    ssl.StatusCakeSSL.URL_UPDATE_TEST = url + "/API/SSL/Update"
+
+
+# constructor parameters of a module class, all unset
+def blank_params(cls):
+    names = list(inspect.signature(cls.__init__).parameters)[4:]
+    return dict((name, None) for name in names)
+
+
+def uptime_params(i, **kwargs):
+    params = blank_params(uptime.StatusCakeUptime)
+    params.update({'name': 'managed-%d' % i,
+                   'url': 'https://managed-%d.example.com' % i,
+                   'state': 'present',
+                   'test_tags': 'managed',
+                   'check_rate': 300})
+    params.update(kwargs)
+    return params
+
+
+def ssl_params(i, **kwargs):
+    params = blank_params(ssl.StatusCakeSSL)
+    params.update({'domain': 'https://managed-%d.example.com' % i,
+                   'state': 'present',
+                   'checkrate': 3600,
+                   'contact_group': 1,
+                   'alert_at': '1,7,30',
+                   'alert_expiry': True,
+                   'alert_reminder': True,
+                   'alert_broken': True,
+                   'alert_mixed': True})
+    params.update(kwargs)
+    return params
+
+
+class Bench:
+
+    def __init__(self, args):
+        self.args = args
+
+    def client(self, module):
+        return StatusCakeClient(module, 'bench', 'bench',
+                                rate_limit=self.args.rate_limit)
+
+    def uptime_bulk(self, tests):
+        module = BenchModule()
+        client = self.client(module)
+        bulk = uptime.StatusCakeUptimeBulk(module, 'bench', 'bench', tests,
+                                           client=client)
+        bulk.concurrency = self.args.concurrency
+        bulk.reconcile()
+        return client
+
+    # one module run per test, as a loop of single test tasks does
+    def uptime_single(self, tests):
+        calls = 0
+        throttled = 0.0
+        for params in tests:
+            module = BenchModule()
+            test = uptime.StatusCakeUptime(module, 'bench', 'bench',
+                                           **params)
+            test.client = self.client(module)
+            test.create_test()
+            calls += test.client.calls
+            throttled += test.client.throttled
+        return calls, throttled
+
+    def uptime_list(self):
+        module = BenchModule()
+        test = uptime.StatusCakeUptime(module, 'bench', 'bench',
+                                       **blank_params(uptime.StatusCakeUptime))
+        test.client = self.client(module)
+        test.get_all_tests()
+        return test.client
+
+    # pause or unpause the tests of one of the ten tag groups of the account
+    def uptime_pause(self, paused):
+        module = BenchModule()
+        client = self.client(module)
+        pause = uptime.StatusCakeUptimePause(
+            module, 'bench', 'bench', paused,
+            TestSelector({'tag': 'group-1'}, uptime.StatusCakeUptime.FILTERS),
+            client=client)
+        pause.concurrency = max(self.args.concurrency, 10)
+        pause.apply()
+        return client
+
+    def ssl_bulk(self, tests):
+        module = BenchModule()
+        client = self.client(module)
+        bulk = ssl.StatusCakeSSLBulk(module, 'bench', 'bench', tests,
+                                     client=client)
+        bulk.reconcile()
+        return client
+
+    def scenarios(self):
+        n = self.args.managed
+        single = min(n, self.args.single)
+        return [
+            ('uptime-create', lambda: self.uptime_bulk(
+                [uptime_params(i) for i in range(n)])),
+            ('uptime-noop', lambda: self.uptime_bulk(
+                [uptime_params(i) for i in range(n)])),
+            ('uptime-update', lambda: self.uptime_bulk(
+                [uptime_params(i, check_rate=600) for i in range(n)])),
+            ('uptime-single-noop', lambda: self.uptime_single(
+                [uptime_params(i, check_rate=600) for i in range(single)])),
+            ('uptime-list', self.uptime_list),
+            ('uptime-pause', lambda: self.uptime_pause(True)),
+            ('uptime-unpause', lambda: self.uptime_pause(False)),
+            ('uptime-delete', lambda: self.uptime_bulk(
+                [uptime_params(i, state='absent') for i in range(n)])),
+            ('ssl-create', lambda: self.ssl_bulk(
+                [ssl_params(i) for i in range(n)])),
+            ('ssl-noop', lambda: self.ssl_bulk(
+                [ssl_params(i) for i in range(n)])),
+            ('ssl-update', lambda: self.ssl_bulk(
+                [ssl_params(i, alert_at='7,14,30') for i in range(n)])),
+            ('ssl-delete', lambda: self.ssl_bulk(
+                [ssl_params(i, state='absent') for i in range(n)])),
+        ]
+
+    def run(self, size):
+        server = FakeServer(size, max(1, size // 10),
+                            self.args.latency / 1000.0,
+                            self.args.throttle_every)
+        point_to(server.url)
+        results = []
+        try:
+            for name, scenario in self.scenarios():
+                if self.args.scenarios and name not in self.args.scenarios:
+                    continue
+                server.control('/_reset')
+                error = None
+                throttled = 0.0
+                tracemalloc.start()
+                start = time.time()
+                try:
+                    outcome = scenario()
+                    if isinstance(outcome, tuple):
+                        throttled = outcome[1]
+                    else:
+                        throttled = outcome.throttled
+                except Exception as e:
+                    error = "{0}: {1}".format(type(e).__name__, e)
+                wall = time.time() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                stats = server.control('/_stats')
+
+                results.append({'scenario': name,
+                                'account_size': size,
+                                'managed': self.args.managed,
+                                'wall_time': round(wall, 3),
+                                'http_calls': stats['requests'],
+                                'calls': stats['calls'],
+                                'bytes_in': stats['bytes_in'],
+                                'bytes_out': stats['bytes_out'],
+                                'throttled': stats['throttled'],
+                                'throttled_time': round(throttled, 3),
+                                'peak_memory': peak,
+                                'error': error})
+        finally:
+            server.stop()
+        return results
+
+
+def report(results):
+    line = "{0:<20} {1:>8} {2:>8} {3:>10} {4:>8} {5:>12} {6:>12} {7:>10}"
+    print(line.format("scenario", "account", "managed", "wall (s)",
+                      "calls", "sent (B)", "recv (B)", "peak (KiB)"))
+    for r in results:
+        print(line.format(r['scenario'], r['account_size'], r['managed'],
+                          "%.3f" % r['wall_time'], r['http_calls'],
+                          r['bytes_in'], r['bytes_out'],
+                          r['peak_memory'] // 1024))
+        if r['error']:
+            print("  failed: " + r['error'])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of the StatusCake modules")
+    parser.add_argument('--sizes', default="100,1000",
+                        help="comma separated account sizes (uptime tests)")
+    parser.add_argument('--managed', type=int, default=50,
+                        help="number of tests managed by each scenario")
+    parser.add_argument('--single', type=int, default=10,
+                        help="number of tests of the single task scenario")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="latency of the fake API, in ms")
+    parser.add_argument('--throttle-every', type=int, default=0,
+                        help="answer every Nth request with HTTP 429")
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--rate-limit', type=float, default=None)
+    parser.add_argument('--scenarios', default=None,
+                        help="comma separated scenarios to run")
+    parser.add_argument('--json', default=None,
+                        help="also write the results to this JSON file")
+    args = parser.parse_args()
+    if args.scenarios:
+        args.scenarios = args.scenarios.split(',')
+
+    bench = Bench(args)
+    results = []
+    for size in args.sizes.split(','):
+        results.extend(bench.run(int(size)))
+
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
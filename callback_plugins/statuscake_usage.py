@@ -0,0 +1,196 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+# Aggregate the StatusCake API usage reported by the statuscake_uptime and
+# statuscake_ssl tasks of each play: calls and bytes per endpoint, latency
+# percentiles, throttled time, cache hits and slowest tests. The report of
+# every play is displayed at its end and, when STATUSCAKE_USAGE_REPORT is
+# set, written as JSON to this file at the end of the playbook.
+#
+# The calls per endpoint, latencies and slowest tests are only known for
+# the tasks run with the metrics option, the other tasks only report their
+# number of calls and throttled time.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import math
+import os
+
+from ansible.plugins.callback import CallbackBase
+
+
+# nearest-rank percentile of sorted values
+def percentile(values, rank):
+    if not values:
+        return None
+    index = int(math.ceil(rank / 100.0 * len(values))) - 1
+    return values[max(0, index)]
+
+
+class CallbackModule(CallbackBase):
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'statuscake_usage'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    MODULES = ('statuscake_uptime', 'statuscake_ssl')
+    SLOWEST_TESTS = 10
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self.report_path = os.getenv('STATUSCAKE_USAGE_REPORT')
+        self.reports = []
+        self.play = None
+
+    def start_play(self, name):
+        self.play = {'name': name,
+                     'tasks': 0,
+                     'tasks_with_metrics': 0,
+                     'api_calls': 0,
+                     'throttled_time': 0.0,
+                     'bytes': 0,
+                     'cache': {'hits': 0, 'misses': 0},
+                     'endpoints': {},
+                     'tests': []}
+
+    def v2_playbook_on_play_start(self, play):
+        self.end_play()
+        self.start_play(play.get_name())
+
+    def v2_runner_on_ok(self, result):
+        self.record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self.record(result)
+
+    def v2_playbook_on_stats(self, stats):
+        self.end_play()
+        if self.report_path:
+            with open(self.report_path, 'w') as f:
+                json.dump({'plays': self.reports}, f, indent=2)
+
+    def record(self, result):
+        if result._task.action not in self.MODULES:
+            return
+        if self.play is None:
+            self.start_play('')
+
+        items = result._result.get('results', [])
+        if any(item.get('_ansible_item_result') for item in items):
+            usages = items
+        else:
+            usages = [result._result]
+
+        for usage in usages:
+            if 'api_calls' in usage:
+                self.add_usage(usage, result._host.get_name(),
+                               result._task.get_name())
+
+    def add_usage(self, usage, host, task):
+        play = self.play
+        play['tasks'] += 1
+        play['api_calls'] += usage.get('api_calls') or 0
+        play['throttled_time'] += usage.get('throttled_time') or 0
+
+        metrics = usage.get('metrics')
+        if not metrics:
+            return
+        play['tasks_with_metrics'] += 1
+        play['bytes'] += metrics.get('bytes', 0)
+        for key in ('hits', 'misses'):
+            play['cache'][key] += metrics.get('cache', {}).get(key, 0)
+
+        for endpoint, stats in metrics.get('endpoints', {}).items():
+            total = play['endpoints'].setdefault(endpoint, {'calls': 0,
+                                                            'bytes': 0,
+                                                            'times': []})
+            total['calls'] += stats['calls']
+            total['bytes'] += stats['bytes']
+            total['times'].extend(stats['times'])
+
+        for test in metrics.get('slowest_tests', []):
+            play['tests'].append({'test': test['test'],
+                                  'time': test['time'],
+                                  'host': host,
+                                  'task': task})
+
+    @staticmethod
+    def latency(times):
+        times = sorted(times)
+        return {'p50': percentile(times, 50),
+                'p95': percentile(times, 95),
+                'p99': percentile(times, 99),
+                'max': times[-1] if times else None}
+
+    def end_play(self):
+        play = self.play
+        self.play = None
+        if not play or not play['tasks']:
+            return
+
+        all_times = []
+        endpoints = {}
+        for endpoint, stats in play['endpoints'].items():
+            all_times.extend(stats['times'])
+            endpoints[endpoint] = {'calls': stats['calls'],
+                                   'bytes': stats['bytes'],
+                                   'latency': self.latency(stats['times'])}
+
+        report = {'play': play['name'],
+                  'tasks': play['tasks'],
+                  'tasks_with_metrics': play['tasks_with_metrics'],
+                  'api_calls': play['api_calls'],
+                  'throttled_time': round(play['throttled_time'], 3),
+                  'bytes': play['bytes'],
+                  'cache': play['cache'],
+                  'latency': self.latency(all_times),
+                  'endpoints': endpoints,
+                  'slowest_tests': sorted(play['tests'],
+                                          key=lambda t: -t['time'])[
+                                              :self.SLOWEST_TESTS]}
+        self.reports.append(report)
+        self.display_report(report)
+
+    def display_report(self, report):
+        display = self._display.display
+        display("StatusCake API usage of play " + report['play'] + ": " +
+                "{0} calls by {1} tasks, {2}s throttled, {3} bytes".format(
+                    report['api_calls'], report['tasks'],
+                    report['throttled_time'], report['bytes']))
+        if report['tasks_with_metrics'] < report['tasks']:
+            display("  {0} tasks without the metrics option are only "
+                    "counted in the totals".format(
+                        report['tasks'] - report['tasks_with_metrics']))
+
+        line = "  {0:<30} {1:>7} {2:>12} {3:>8} {4:>8} {5:>8}"
+        if report['endpoints']:
+            display(line.format("endpoint", "calls", "bytes", "p50 (s)",
+                                "p95 (s)", "p99 (s)"))
+            for endpoint, stats in sorted(report['endpoints'].items()):
+                latency = stats['latency']
+                display(line.format(endpoint, stats['calls'], stats['bytes'],
+                                    latency['p50'], latency['p95'],
+                                    latency['p99']))
+            display("  cache: {0} hits, {1} misses".format(
+                report['cache']['hits'], report['cache']['misses']))
+
+        if report['slowest_tests']:
+            display("  slowest tests:")
+            for test in report['slowest_tests']:
+                display("    {0}s {1} ({2}, {3})".format(
+                    test['time'], test['test'], test['host'], test['task']))
@@ -0,0 +1,283 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {'status': ['preview'],
+                    'supported_by': 'community',
+                    'version': '0.1'}
+
+DOCUMENTATION = '''
+---
+module: statuscake_info
+short_description: Gather facts about a StatusCake account
+description:
+    - Gather the uptime tests, SSL tests and contact groups of a StatusCake
+      account as the statuscake fact, indexed by test name, domain and group
+      name. The lists are downloaded at the same time.
+    - The fact is kept by the Ansible fact cache when it is enabled. With
+      cache_dir, the lists are also cached between tasks and shared with
+      statuscake_uptime and statuscake_ssl.
+version_added: "2.2"
+author: "Raphael Pereira Ribeiro (@raphapr)"
+options:
+  username:
+    description:
+      - StatusCake account username. Can also be supplied via $STATUSCAKE_USERNAME env variable.
+    required: false
+  api_key:
+    description:
+      - StatusCake API KEY. Can also be supplied via $STATUSCAKE_API_KEY env variable.
+    required: false
+  gather:
+    description:
+      - Lists gathered.
+    choices: ['uptime', 'ssl', 'contact_groups']
+    default: ['uptime', 'ssl']
+    required: false
+  cache_dir:
+    description:
+      - Directory where the lists are cached between tasks, shared with the
+        cache_dir of statuscake_uptime and statuscake_ssl.
+      - The cache is disabled when not set.
+    required: false
+  cache_ttl:
+    description:
+      - Number of seconds a cached list can be used before it is downloaded
+        again.
+    default: 300
+    required: false
+  connect_timeout:
+    description:
+      - Number of seconds to wait for the connection to the StatusCake API.
+      - The connection and the responses share a single timeout, the
+        greater of connect_timeout and read_timeout.
+    default: 10
+    required: false
+  read_timeout:
+    description:
+      - Number of seconds to wait for a response of the StatusCake API.
+    default: 60
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of requests per second sent to the StatusCake API.
+        The limit is shared by every task and fork using the same account
+        on the host running the module.
+      - No limit is applied when not set.
+    required: false
+  max_retries:
+    description:
+      - Number of times a throttled request (HTTP 429 or 503) is retried,
+        after the Retry-After delay or an exponential backoff.
+    default: 5
+    required: false
+  metrics:
+    description:
+      - Return the performance metrics of the task, see the metrics return
+        value of statuscake_uptime.
+    default: false
+    required: false
+'''
+
+EXAMPLES = '''
+---
+- name: Gather statuscake facts
+  statuscake_info:
+    username: user
+    api_key: api
+    gather: [uptime, ssl, contact_groups]
+    cache_dir: /tmp/statuscake
+
+- name: Show the check rate of a test
+  debug:
+    msg: "{{ statuscake.uptime['MyWebSite'].CheckRate }}"
+'''
+
+RETURN = '''
+ansible_facts:
+    description: Facts about the StatusCake account.
+    returned: success
+    type: complex
+    contains:
+        statuscake:
+            description: Uptime tests by WebsiteName, SSL tests by domain and contact groups by GroupName, with their number and the names shared by several uptime tests (the first test is kept).
+            type: dictionary
+            sample: {"uptime": {"MyWebSite": {"TestID": 1234, "WebsiteName": "MyWebSite", "WebsiteURL": "https://www.google.com", "CheckRate": 300, "Paused": 0, "TestTags": "production,web"}}, "ssl": {"https://example.com": {"id": "5678", "domain": "https://example.com", "checkrate": 86400, "alert_at": "1,7,30"}}, "count": {"uptime": 1, "ssl": 1}, "duplicates": {}}
+api_calls:
+    description: Number of requests sent to the StatusCake API by the task.
+    returned: success
+    type: int
+    sample: 2
+throttled_time:
+    description: Number of seconds spent waiting for the rate limit or before retrying throttled requests.
+    returned: success
+    type: float
+    sample: 0.0
+'''
+
+import os
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.statuscake import (Metrics,
+                                              StatusCakeCache,
+                                              StatusCakeClient,
+                                              StatusCakeError,
+                                              normalize_record,
+                                              run_concurrently)
+
+
+class StatusCakeInfo:
+    URL_ALL_TESTS = "https://app.statuscake.com/API/Tests"
+    URL_ALL_SSL = "https://app.statuscake.com/API/SSL"
+    URL_CONTACT_GROUPS = "https://app.statuscake.com/API/ContactGroups"
+
+    # gathered list -> (url, field the facts are indexed by)
+    LISTS = {'uptime': (URL_ALL_TESTS, 'WebsiteName'),
+             'ssl': (URL_ALL_SSL, 'domain'),
+             'contact_groups': (URL_CONTACT_GROUPS, 'GroupName')}
+
+    def __init__(self, module, client, gather):
+        self.module = module
+        self.client = client
+        self.gather = gather
+
+        # optional gathered list -> StatusCakeCache
+        self.caches = {}
+
+        self.facts = {'count': {}, 'duplicates': {}}
+
+    def fetch(self, kind):
+        url, key = self.LISTS[kind]
+        cache = self.caches.get(kind)
+        items = cache.get() if cache else None
+        if items is None:
+            items = self.client.get_list(url)
+            if cache:
+                cache.set(items)
+        return items
+
+    # index the records by key, the first record wins when several records
+    # share the same key
+    @staticmethod
+    def index(items, key):
+        indexed = {}
+        duplicates = {}
+        for item in items:
+            record = normalize_record(dict(item))
+            name = record.get(key)
+            if name in indexed:
+                duplicates.setdefault(name, 1)
+                duplicates[name] += 1
+            else:
+                indexed[name] = record
+        return indexed, duplicates
+
+    def gather_facts(self):
+        lists = run_concurrently(self.fetch, self.gather, len(self.gather))
+        for kind, items in zip(self.gather, lists):
+            indexed, duplicates = self.index(items, self.LISTS[kind][1])
+            self.facts[kind] = indexed
+            self.facts['count'][kind] = len(items)
+            if kind == 'uptime':
+                self.facts['duplicates'] = duplicates
+
+    def get_result(self):
+        return {'changed': False,
+                'ansible_facts': {'statuscake': self.facts}}
+
+
+def run_module():
+    metrics = Metrics()
+
+    module_args = dict(
+        username=dict(type='str', required=False),
+        api_key=dict(type='str', required=False),
+        gather=dict(type='list', required=False, default=['uptime', 'ssl']),
+        cache_dir=dict(type='path', required=False),
+        cache_ttl=dict(type='int', required=False, default=300),
+        connect_timeout=dict(type='int', required=False, default=10),
+        read_timeout=dict(type='int', required=False, default=60),
+        rate_limit=dict(type='float', required=False),
+        max_retries=dict(type='int', required=False, default=5),
+        metrics=dict(type='bool', required=False, default=False),
+    )
+
+    module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+            )
+
+    username = module.params['username']
+    api_key = module.params['api_key']
+    gather = module.params['gather']
+
+    unknown = [k for k in gather if k not in StatusCakeInfo.LISTS]
+    if unknown:
+        module.fail_json(msg="gather only supports " +
+                             ", ".join(sorted(StatusCakeInfo.LISTS)) +
+                             ", got: " + ", ".join(unknown))
+
+    if not (username and api_key) and \
+            os.environ.get('STATUSCAKE_USERNAME') and \
+            os.environ.get('STATUSCAKE_API_KEY'):
+        username = os.environ.get('STATUSCAKE_USERNAME')
+        api_key = os.environ.get('STATUSCAKE_API_KEY')
+    if not (username and api_key) and \
+            not (os.environ.get('STATUSCAKE_USERNAME') and \
+            os.environ.get('STATUSCAKE_API_KEY')):
+        module.fail_json(msg="You must set STATUSCAKE_USERNAME and " +
+                             "STATUSCAKE_API_KEY environment variables " +
+                             "or set username/api_key module arguments")
+
+    client = StatusCakeClient(module,
+                              username,
+                              api_key,
+                              module.params['connect_timeout'],
+                              module.params['read_timeout'],
+                              module.params['rate_limit'],
+                              module.params['max_retries'])
+
+    if module.params['metrics']:
+        client.metrics = metrics
+
+    info = StatusCakeInfo(module, client, gather)
+    if module.params['cache_dir']:
+        for kind in gather:
+            cache = StatusCakeCache(module.params['cache_dir'],
+                                    module.params['cache_ttl'],
+                                    username,
+                                    StatusCakeInfo.LISTS[kind][0])
+            cache.metrics = client.metrics
+            info.caches[kind] = cache
+
+    try:
+        info.gather_facts()
+    except StatusCakeError as e:
+        module.fail_json(msg=str(e))
+
+    result = info.get_result()
+    result['api_calls'] = client.calls
+    result['throttled_time'] = round(client.throttled, 3)
+    if module.params['metrics']:
+        result['metrics'] = metrics.result()
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,586 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+ANSIBLE_METADATA = {'status': ['preview'],
+                    'supported_by': 'community',
+                    'version': '0.1'}
+
+DOCUMENTATION = '''
+---
+module: statuscake_snapshot
+short_description: Export, plan and apply StatusCake account snapshots
+description:
+    - Export the uptime and SSL tests of a StatusCake account to a snapshot
+      file, compute the changes needed to make the account match a desired
+      snapshot file and apply them.
+    - A snapshot file is a JSON or YAML dictionary with an uptime list and an
+      ssl list. Uptime tests use the fields of the StatusCake update form
+      (WebsiteName, WebsiteURL, CheckRate, ...) and SSL tests the fields of
+      the SSL update form (domain, checkrate, contact_groups, ...).
+    - Uptime tests are matched by TestID when set in the desired file, by
+      WebsiteName otherwise. SSL tests are matched by domain. Tests of the
+      account missing from the desired file are deleted.
+    - A kind of test whose list is missing from the desired file is left
+      untouched, an empty list deletes every test of that kind.
+requirements:
+  - "PyYAML for YAML snapshot files"
+version_added: "2.2"
+author: "Raphael Pereira Ribeiro (@raphapr)"
+options:
+  username:
+    description:
+      - StatusCake account username. Can also be supplied via $STATUSCAKE_USERNAME env variable.
+    required: false
+  api_key:
+    description:
+      - StatusCake API KEY. Can also be supplied via $STATUSCAKE_API_KEY env variable.
+    required: false
+  state:
+    description:
+      - With export, write the tests of the account to path.
+      - With plan, return the tests to create, update and delete so that the
+        account matches the desired file, without changing anything.
+      - With apply, compute the plan and apply it, with one write request per
+        created, updated or deleted test.
+    choices: ['export', 'plan', 'apply']
+    default: export
+    required: false
+  path:
+    description:
+      - Snapshot file written by state=export.
+    required: false
+  desired:
+    description:
+      - Desired snapshot file of state=plan and state=apply.
+    required: false
+  format:
+    description:
+      - Format of the snapshot files, guessed from their extension (.yml and
+        .yaml for YAML, JSON otherwise) when not set.
+    choices: ['json', 'yaml']
+    required: false
+  include:
+    description:
+      - Kinds of tests handled by the module.
+    choices: ['uptime', 'ssl']
+    default: ['uptime', 'ssl']
+    required: false
+  max_deletes:
+    description:
+      - With apply, the task fails without changing anything when more than
+        this number of tests would be deleted, counting every kind of test.
+    default: 10
+    required: false
+  concurrency:
+    description:
+      - Number of test details downloaded or write requests sent at the same
+        time.
+    default: 4
+    required: false
+  connect_timeout:
+    description:
+      - Number of seconds to wait for the connection to the StatusCake API.
+      - The connection and the responses share a single timeout, the
+        greater of connect_timeout and read_timeout.
+    default: 10
+    required: false
+  read_timeout:
+    description:
+      - Number of seconds to wait for a response of the StatusCake API.
+    default: 60
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of requests per second sent to the StatusCake API.
+        The limit is shared by every task and fork using the same account
+        on the host running the module.
+      - No limit is applied when not set.
+    required: false
+  max_retries:
+    description:
+      - Number of times a throttled request (HTTP 429 or 503) is retried,
+        after the Retry-After delay or an exponential backoff.
+    default: 5
+    required: false
+  metrics:
+    description:
+      - Return the performance metrics of the task, see the metrics return
+        value of statuscake_uptime.
+    default: false
+    required: false
+'''
+
+EXAMPLES = '''
+---
+- name: Export the statuscake account
+  statuscake_snapshot:
+    username: user
+    api_key: api
+    state: export
+    path: statuscake.yml
+
+- name: Show the changes needed to match the desired snapshot
+  statuscake_snapshot:
+    username: user
+    api_key: api
+    state: plan
+    desired: statuscake.yml
+  register: plan
+
+- name: Apply the desired snapshot
+  statuscake_snapshot:
+    username: user
+    api_key: api
+    state: apply
+    desired: statuscake.yml
+    concurrency: 8
+    max_deletes: 20
+'''
+
+RETURN = '''
+summary:
+    description: Number of tests exported, or to create, update, delete and left unchanged, per kind of test.
+    returned: success
+    type: dictionary
+    sample: {"uptime": {"create": 1, "update": 2, "delete": 0, "unchanged": 40}, "ssl": {"create": 0, "update": 0, "delete": 1, "unchanged": 12}}
+plan:
+    description: Tests to create, update and delete, per kind of test. Updates list the fields before and after the change.
+    returned: success, when state is plan or apply
+    type: dictionary
+    sample: {"uptime": {"create": ["MyWebSite"], "update": [{"test": "Other", "id": 1234, "before": {"CheckRate": 600}, "after": {"CheckRate": 300}}], "delete": [{"test": "Old", "id": 1200}]}, "ssl": {"create": [], "update": [], "delete": []}}
+api_calls:
+    description: Number of requests sent to the StatusCake API by the task.
+    returned: success
+    type: int
+    sample: 45
+throttled_time:
+    description: Number of seconds spent waiting for the rate limit or before retrying throttled requests.
+    returned: success
+    type: float
+    sample: 1.5
+diff:
+    description: Show the fields before and after each planned change.
+    returned: when state is plan or apply
+    type: list
+'''
+
+import os
+import tempfile
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.statuscake import (Metrics,
+                                              SSL_SCHEMA,
+                                              StatusCakeClient,
+                                              StatusCakeError,
+                                              UPTIME_SCHEMA,
+                                              UptimeIndex,
+                                              convert_ssl_test,
+                                              convert_uptime_details,
+                                              dump_snapshot,
+                                              normalize_record,
+                                              read_snapshot,
+                                              run_concurrently)
+
+
+class StatusCakeSnapshot:
+    URL_ALL_TESTS = "https://app.statuscake.com/API/Tests"
+    URL_DETAILS_TEST = "https://app.statuscake.com/API/Tests/Details"
+    URL_UPDATE_TEST = "https://app.statuscake.com/API/Tests/Update"
+    URL_ALL_SSL = "https://app.statuscake.com/API/SSL"
+    URL_UPDATE_SSL = "https://app.statuscake.com/API/SSL/Update"
+
+    # fields of the update form of an uptime test
+    UPTIME_FIELDS = ('WebsiteName', 'WebsiteURL', 'CheckRate', 'TestType',
+                     'TestTags', 'ContactGroup', 'Paused', 'NodeLocations',
+                     'Confirmation', 'Timeout', 'StatusCodes', 'WebsiteHost',
+                     'FollowRedirect', 'FindString', 'Port', 'DoNotFind',
+                     'TriggerRate', 'BasicUser', 'BasicPass', 'CustomHeader',
+                     'PostRaw')
+
+    # fields sent to the API but never returned by it
+    WRITE_ONLY_FIELDS = ('TestID', 'BasicPass')
+
+    # fields of the SSL tests ignored by the plan, as statuscake_ssl does
+    SSL_IGNORED_FIELDS = ('id', 'checkrate')
+
+    def __init__(self, module, client, include, concurrency):
+        self.module = module
+        self.client = client
+        self.include = include
+        self.concurrency = concurrency
+        # apply fails when the plan deletes more tests than that
+        self.max_deletes = None
+
+        self.result = {
+            'changed': False,
+            'summary': {}
+        }
+
+    # uptime tests of the account with their details, as update form fields
+    def export_uptime(self):
+        tests = self.client.get_list(self.URL_ALL_TESTS)
+
+        def details(item):
+            record = convert_uptime_details(
+                self.client.get(self.URL_DETAILS_TEST,
+                                params={'TestID': item['TestID']}),
+                self.UPTIME_FIELDS)
+            record['TestID'] = item['TestID']
+            return record
+
+        return run_concurrently(details, tests, self.concurrency)
+
+    # SSL tests of the account, as update form fields
+    def export_ssl(self):
+        records = []
+        for item in self.client.get_list(self.URL_ALL_SSL):
+            record = convert_ssl_test(item)
+            if item.get('checkrate') is not None:
+                record['checkrate'] = item['checkrate']
+            records.append(normalize_record(record))
+        return records
+
+    def export(self):
+        snapshot = {}
+        if 'uptime' in self.include:
+            snapshot['uptime'] = sorted(self.export_uptime(),
+                                        key=lambda r: r['TestID'])
+        if 'ssl' in self.include:
+            snapshot['ssl'] = sorted(self.export_ssl(),
+                                     key=lambda r: str(r['domain']))
+        for kind, records in snapshot.items():
+            self.result['summary'][kind] = {'exported': len(records)}
+        return snapshot
+
+    @staticmethod
+    def diff(schema, desired, current, ignored):
+        return schema.diff(schema.normalize(desired),
+                           schema.normalize(current, True), ignored)
+
+    # (create, update, delete) plan of the uptime tests: desired records,
+    # (test id, desired record, diff keys, current record) and list records
+    def plan_uptime(self, desired):
+        tests = self.client.get_list(self.URL_ALL_TESTS)
+        index = UptimeIndex(tests)
+
+        create = []
+        matched = []
+        seen = set()
+        for record in desired:
+            item = index.find(record.get('TestID'), record.get('WebsiteName'))
+            if item is None or item['TestID'] in seen:
+                create.append(record)
+            else:
+                seen.add(item['TestID'])
+                matched.append((item['TestID'], record))
+
+        def details(match):
+            test_id, record = match
+            current = convert_uptime_details(
+                self.client.get(self.URL_DETAILS_TEST,
+                                params={'TestID': test_id}),
+                self.UPTIME_FIELDS)
+            return (test_id, record,
+                    self.diff(UPTIME_SCHEMA, record, current,
+                              self.WRITE_ONLY_FIELDS),
+                    current)
+
+        update = [change for change in
+                  run_concurrently(details, matched, self.concurrency)
+                  if change[2]]
+        delete = [item for item in tests if item['TestID'] not in seen]
+        return create, update, delete, len(matched) - len(update)
+
+    def plan_ssl(self, desired):
+        ssl_tests = {}
+        for item in self.client.get_list(self.URL_ALL_SSL):
+            if item['domain'] not in ssl_tests:
+                ssl_tests[item['domain']] = normalize_record(
+                    convert_ssl_test(item))
+
+        create = []
+        update = []
+        seen = set()
+        for record in desired:
+            current = ssl_tests.get(record.get('domain'))
+            if current is None or record['domain'] in seen:
+                create.append(record)
+                continue
+            seen.add(record['domain'])
+            diffkeys = self.diff(SSL_SCHEMA, record, current,
+                                 self.SSL_IGNORED_FIELDS)
+            if diffkeys:
+                update.append((current['id'], record, diffkeys, current))
+        delete = [item for domain, item in ssl_tests.items()
+                  if domain not in seen]
+        return create, update, delete, len(seen) - len(update)
+
+    # plans of the included kinds of tests listed in the desired snapshot,
+    # a missing list is not an empty one
+    def plan(self, snapshot):
+        plans = {}
+        if 'uptime' in self.include and 'uptime' in snapshot:
+            plans['uptime'] = self.plan_uptime(
+                [normalize_record(dict(r)) for r in
+                 snapshot['uptime'] or []])
+        if 'ssl' in self.include and 'ssl' in snapshot:
+            plans['ssl'] = self.plan_ssl(
+                [normalize_record(dict(r)) for r in
+                 snapshot['ssl'] or []])
+
+        self.result['plan'] = {}
+        self.result['diff'] = []
+        for kind, (create, update, delete, unchanged) in plans.items():
+            label = self.label_uptime if kind == 'uptime' else self.label_ssl
+            self.result['summary'][kind] = {'create': len(create),
+                                            'update': len(update),
+                                            'delete': len(delete),
+                                            'unchanged': unchanged}
+            self.result['plan'][kind] = {
+                'create': [label(r) for r in create],
+                'update': [{'test': label(r), 'id': test_id,
+                            'before': dict((k, current[k]) for k in keys),
+                            'after': dict((k, r[k]) for k in keys)}
+                           for test_id, r, keys, current in update],
+                'delete': [{'test': label(item), 'id': self.test_id(item)}
+                           for item in delete]}
+            for change in self.result['plan'][kind]['update']:
+                self.result['diff'].append({'before_header': change['test'],
+                                            'after_header': change['test'],
+                                            'before': change['before'],
+                                            'after': change['after']})
+            for test in self.result['plan'][kind]['create']:
+                self.result['diff'].append({'before_header': test,
+                                            'after_header': test,
+                                            'before': {}, 'after': {}})
+        return plans
+
+    @staticmethod
+    def pending(plans):
+        return any(create or update or delete
+                   for create, update, delete, unchanged in plans.values())
+
+    def check_deletes(self, plans):
+        deleted = [label(item) for kind, label in
+                   (('uptime', self.label_uptime), ('ssl', self.label_ssl))
+                   if kind in plans for item in plans[kind][2]]
+        if self.max_deletes is not None and \
+                len(deleted) > self.max_deletes:
+            raise StatusCakeError(
+                "apply would delete " + str(len(deleted)) + " tests, more " +
+                "than max_deletes (" + str(self.max_deletes) + "): " +
+                ", ".join(deleted))
+
+    @staticmethod
+    def label_uptime(record):
+        return record.get('WebsiteName') or str(record.get('TestID'))
+
+    @staticmethod
+    def label_ssl(record):
+        return record.get('domain')
+
+    @staticmethod
+    def test_id(item):
+        return item.get('TestID', item.get('id'))
+
+    # send the write requests of the plans: one per created, updated or
+    # deleted test, up to concurrency at the same time
+    def apply(self, plans):
+        writes = []
+        if 'uptime' in plans:
+            create, update, delete, unchanged = plans['uptime']
+            for record in create:
+                writes.append(("PUT", self.URL_UPDATE_TEST,
+                               self.form(record, ('TestID',)), None))
+            for test_id, record, keys, current in update:
+                data = self.form(record, ('TestID',))
+                data['TestID'] = test_id
+                writes.append(("PUT", self.URL_UPDATE_TEST, data, None))
+            for item in delete:
+                writes.append(("DELETE", self.URL_DETAILS_TEST,
+                               {'TestID': item['TestID']}, None))
+        if 'ssl' in plans:
+            create, update, delete, unchanged = plans['ssl']
+            for record in create:
+                writes.append(("PUT", self.URL_UPDATE_SSL,
+                               self.form(record, ('id',)), None))
+            for test_id, record, keys, current in update:
+                data = self.form(record, ('id', 'domain'))
+                data['id'] = test_id
+                writes.append(("PUT", self.URL_UPDATE_SSL, data, None))
+            for item in delete:
+                writes.append(("DELETE", self.URL_UPDATE_SSL, None,
+                               {'id': item['id']}))
+
+        def write(request):
+            method, url, data, params = request
+            if method == "PUT":
+                response = self.client.put(url, data=data)
+            else:
+                response = self.client.delete(url, data=data, params=params)
+            if response.get('Success') or str(
+                    response.get('Message')).startswith(
+                        'No data has been updated'):
+                return None
+            return "{0} {1} {2}: {3}".format(method, url, data or params,
+                                             response.get('Message'))
+
+        errors = [e for e in run_concurrently(write, writes, self.concurrency)
+                  if e]
+        if errors:
+            self.module.fail_json(msg="Some changes failed: " +
+                                      "; ".join(errors),
+                                  **self.result)
+
+    @staticmethod
+    def form(record, excluded):
+        return dict((k, v) for k, v in record.items()
+                    if v is not None and k not in excluded)
+
+    def get_result(self):
+        result = self.result
+        return result
+
+
+def load_snapshot(module, path):
+    try:
+        return read_snapshot(path, module.params['format'])
+    except StatusCakeError as e:
+        module.fail_json(msg=str(e))
+
+
+# write the snapshot and tell if the file changed
+def save_snapshot(module, path, snapshot):
+    try:
+        content = dump_snapshot(snapshot, path, module.params['format'])
+    except StatusCakeError as e:
+        module.fail_json(msg=str(e))
+
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    except (IOError, OSError):
+        pass
+
+    if not module.check_mode:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(
+            os.path.abspath(path)))
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        module.atomic_move(tmp_path, path)
+    return True
+
+
+def run_module():
+    metrics = Metrics()
+
+    module_args = dict(
+        username=dict(type='str', required=False),
+        api_key=dict(type='str', required=False),
+        state=dict(choices=['export', 'plan', 'apply'], default='export'),
+        path=dict(type='path', required=False),
+        desired=dict(type='path', required=False),
+        format=dict(choices=['json', 'yaml'], required=False),
+        include=dict(type='list', required=False,
+                     default=['uptime', 'ssl']),
+        max_deletes=dict(type='int', required=False, default=10),
+        concurrency=dict(type='int', required=False, default=4),
+        connect_timeout=dict(type='int', required=False, default=10),
+        read_timeout=dict(type='int', required=False, default=60),
+        rate_limit=dict(type='float', required=False),
+        max_retries=dict(type='int', required=False, default=5),
+        metrics=dict(type='bool', required=False, default=False),
+    )
+
+    module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True,
+            required_if=[
+              ["state", "export", ["path"]],
+              ["state", "plan", ["desired"]],
+              ["state", "apply", ["desired"]]
+            ]
+            )
+
+    username = module.params['username']
+    api_key = module.params['api_key']
+    state = module.params['state']
+
+    unknown = [k for k in module.params['include']
+               if k not in ('uptime', 'ssl')]
+    if unknown:
+        module.fail_json(msg="include only supports uptime and ssl, got: " +
+                             ", ".join(unknown))
+
+    if not (username and api_key) and \
+            os.environ.get('STATUSCAKE_USERNAME') and \
+            os.environ.get('STATUSCAKE_API_KEY'):
+        username = os.environ.get('STATUSCAKE_USERNAME')
+        api_key = os.environ.get('STATUSCAKE_API_KEY')
+    if not (username and api_key) and \
+            not (os.environ.get('STATUSCAKE_USERNAME') and \
+            os.environ.get('STATUSCAKE_API_KEY')):
+        module.fail_json(msg="You must set STATUSCAKE_USERNAME and " +
+                             "STATUSCAKE_API_KEY environment variables " +
+                             "or set username/api_key module arguments")
+
+    client = StatusCakeClient(module,
+                              username,
+                              api_key,
+                              module.params['connect_timeout'],
+                              module.params['read_timeout'],
+                              module.params['rate_limit'],
+                              module.params['max_retries'])
+
+    if module.params['metrics']:
+        client.metrics = metrics
+
+    snapshot = StatusCakeSnapshot(module,
+                                  client,
+                                  module.params['include'],
+                                  module.params['concurrency'])
+    snapshot.max_deletes = module.params['max_deletes']
+
+    try:
+        if state == "export":
+            snapshot.result['changed'] = save_snapshot(
+                module, module.params['path'], snapshot.export())
+        else:
+            plans = snapshot.plan(load_snapshot(module,
+                                                module.params['desired']))
+            if state == "apply" and snapshot.pending(plans):
+                snapshot.check_deletes(plans)
+                snapshot.result['changed'] = True
+                if not module.check_mode:
+                    snapshot.apply(plans)
+    except StatusCakeError as e:
+        module.fail_json(msg=str(e))
+
+    result = snapshot.get_result()
+    result['api_calls'] = client.calls
+    result['throttled_time'] = round(client.throttled, 3)
+    if module.params['metrics']:
+        result['metrics'] = metrics.result()
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -24,8 +24,6 @@ module: statuscake_ssl
 short_description: Manage StatusCake SSL tests
 description:
     - Manage StatusCake SSL tests by using StatusCake REST API.
-requirements:
-  - "requests >= 2.18.0"
 version_added: "2.2"
 author: "Raphael Pereira Ribeiro (@raphapr)"
 options:
@@ -37,6 +35,21 @@ options:
     description:
       - StatusCake API KEY. Can also be supplied via $STATUSCAKE_API_KEY env variable.
     required: false
+  accounts:
+    description:
+      - Manage the same SSL tests in several StatusCake accounts at the same
+        time, instead of username and api_key.
+      - A list of dictionaries with the username, api_key and an optional
+        name of each account (the username by default), or a dictionary of
+        the username and api_key by account name.
+      - Each account has its own client, rate limit and cache. The results
+        are returned by account name.
+    required: false
+  account_concurrency:
+    description:
+      - Maximum number of accounts managed at the same time.
+    default: 10
+    required: false
   domain:
     description:
       - URL to check, has to start with https://
@@ -82,6 +95,105 @@ options:
       - Set to true to enable mixed content warnings. False to disable
     default: true
     required: false
+  tests:
+    description:
+      - List of SSL tests to manage in a single task. Each item accepts the
+        same options as the module itself (domain, state, contact_group, ...).
+        Options set at the module level are used as defaults for every item.
+      - The account SSL test list is fetched only once for the whole list and
+        only the tests with differences are updated.
+      - Mutually exclusive with domain.
+    required: false
+  cache_dir:
+    description:
+      - Directory where the account SSL test list is cached between tasks.
+        The cache is shared by every task and fork using the same directory
+        and is kept up to date with the changes made by the module.
+      - The cache is disabled when not set.
+    required: false
+  cache_ttl:
+    description:
+      - Number of seconds the cached SSL test list can be used before it is
+        downloaded again.
+    default: 300
+    required: false
+  mirror:
+    description:
+      - SQLite database mirroring the account SSL test list, created when
+        missing. It replaces the cache_dir cache of the SSL test list and
+        can be shared with the mirror of statuscake_uptime.
+      - The mirror is refreshed when it is older than cache_ttl, only the
+        new and changed tests are written. The lookups and state=list use
+        the indexes of the mirror.
+      - Requires the sqlite3 python module. The mirror is disabled when not
+        set.
+    required: false
+  connect_timeout:
+    description:
+      - Number of seconds to wait for the connection to the StatusCake API.
+      - The connection and the responses share a single timeout, the
+        greater of connect_timeout and read_timeout.
+    default: 10
+    required: false
+  read_timeout:
+    description:
+      - Number of seconds to wait for a response of the StatusCake API.
+    default: 60
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of requests per second sent to the StatusCake API.
+        The limit is shared by every task and fork using the same account
+        on the host running the module.
+      - No limit is applied when not set.
+    required: false
+  max_retries:
+    description:
+      - Number of times a throttled request (HTTP 429 or 503) is retried,
+        after the Retry-After delay or an exponential backoff.
+    default: 5
+    required: false
+  filter:
+    description:
+      - With state=list, only return the SSL tests matching every filter of
+        this dictionary. Supported filters are domain (shell pattern) and
+        paused (boolean).
+    required: false
+  fields:
+    description:
+      - With state=list, list of the fields returned for each test. Every
+        field is returned when not set.
+    required: false
+  limit:
+    description:
+      - With state=list, maximum number of tests returned.
+    required: false
+  offset:
+    description:
+      - With state=list, number of matching tests skipped before the first
+        returned test.
+    default: 0
+    required: false
+  metrics:
+    description:
+      - Return the performance metrics of the task, see the metrics return
+        value.
+    default: false
+    required: false
+  offline:
+    description:
+      - Run check mode without any request to the StatusCake API. The tests
+        of the account are read from the snapshot file, or from the cached
+        test list of the mirror or of cache_dir whatever its age.
+      - Only supported in check mode.
+    default: false
+    required: false
+  snapshot:
+    description:
+      - With offline, snapshot file written by statuscake_snapshot
+        (state=export) to read the tests from. The credentials are not
+        needed with a snapshot file.
+    required: false
 '''
 
 EXAMPLES = '''
@@ -98,21 +210,136 @@ EXAMPLES = '''
     alert_reminder: false
     alert_broken: false
     alert_mixed: true
+
+- name: Manage several statuscake SSL tests at once
+  statuscake_ssl:
+    username: user
+    api_key: api
+    contact_group: 1503
+    tests:
+      - domain: "https://example.com"
+      - domain: "https://api.example.com"
+        alert_at: 7,14,30
+      - domain: "https://old.example.com"
+        state: absent
+
+- name: List the statuscake SSL tests of several accounts
+  statuscake_ssl:
+    state: list
+    accounts:
+      - name: production
+        username: prod-user
+        api_key: prod-api
+      - name: staging
+        username: staging-user
+        api_key: staging-api
+'''
+
+RETURN = '''
+---
+domain:
+  description: Domain of the StatusCake SSL test.
+  returned: success, when needed
+  type: string
+  sample: https://example.com
+state:
+  description: State of the StatusCake SSL test.
+  returned: success, when needed
+  type: string
+  sample: present
+response:
+  description: HTTP response message of the request
+  returned: success, when needed
+  type: string
+  sample: "SSL test inserted"
+results:
+    description: Result of each SSL test, in the same order as the tests option.
+    returned: success, when tests is set
+    type: list
+    sample: [{"changed": true, "domain": "https://example.com", "state": "present", "response": "SSL test inserted", "diff": {"before": {}, "after": {}}}]
+summary:
+    description: Number of SSL tests created, updated, deleted and left unchanged.
+    returned: success, when tests is set
+    type: dictionary
+    sample: {"created": 1, "updated": 2, "deleted": 0, "unchanged": 40}
+accounts:
+    description: Result of each account by account name, with the same return values as a task managing a single account, or failed and msg when the account failed.
+    returned: success, when accounts is set
+    type: dictionary
+    sample: {"production": {"changed": false, "tests": {"output": [{"id": "5678", "domain": "https://example.com"}], "count": 1, "matched": 1}, "api_calls": 1, "throttled_time": 0.0}, "staging": {"failed": true, "msg": "Invalid API key"}}
+failed_accounts:
+    description: Names of the accounts that failed.
+    returned: when accounts is set
+    type: list
+    sample: ["staging"]
+api_calls:
+    description: Number of requests sent to the StatusCake API by the task, for all the accounts when accounts is set.
+    returned: success
+    type: int
+    sample: 2
+throttled_time:
+    description: Number of seconds spent waiting for the rate limit or before retrying throttled requests.
+    returned: success
+    type: float
+    sample: 1.5
+metrics:
+    description: Performance metrics of the task, returned when the metrics option is set. Runtime of the module, HTTP calls with their total, maximum and individual times (in seconds) and response sizes (in bytes) per endpoint, time spent parsing JSON responses, cache hits and misses and the slowest tests of the task.
+    returned: success, when metrics is set
+    type: dictionary
+    sample: {"runtime": 1.284, "http_calls": 2, "http_time": 1.052, "bytes": 18342, "parse_time": 0.004, "cache": {"hits": 0, "misses": 1}, "endpoints": {"GET /API/SSL": {"calls": 1, "time": 0.811, "max_time": 0.811, "bytes": 18290, "times": [0.811]}, "PUT /API/SSL/Update": {"calls": 1, "time": 0.241, "max_time": 0.241, "bytes": 52, "times": [0.241]}}, "slowest_tests": [{"test": "https://example.com", "time": 0.245}]}
+diff:
+    description: Show the fields before and after each change. A list with one entry per SSL test when tests is set.
+    returned: always
+    type: dictionary
 '''
 
-import requests
-from ansible.module_utils.basic import *
+import os
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.statuscake import (HAS_SQLITE,
+                                             Metrics,
+                                             OfflineClient,
+                                             SSLRecord,
+                                             SSL_SCHEMA,
+                                             SnapshotCache,
+                                             StatusCakeCache,
+                                             StatusCakeClient,
+                                             StatusCakeError,
+                                             StatusCakeMirror,
+                                             TestSelector,
+                                             account_credentials,
+                                             convert_ssl_test,
+                                             read_snapshot,
+                                             run_accounts,
+                                             ssl_list_item,
+                                             timed_test)
+
+
+REQUIRED_PARAMS = {'present': ['domain', 'contact_group'],
+                   'absent': ['domain']}
+
+# parameters that apply to the whole task rather than to a single test
+ACCOUNT_PARAMS = ('username', 'api_key', 'accounts', 'account_concurrency',
+                  'tests', 'cache_dir', 'cache_ttl',
+                  'mirror',
+                  'connect_timeout', 'read_timeout', 'rate_limit',
+                  'max_retries', 'filter', 'fields', 'limit', 'offset',
+                  'metrics', 'offline', 'snapshot')
 
 
 class StatusCakeSSL:
     URL_UPDATE_TEST = "https://app.statuscake.com/API/SSL/Update"
     URL_ALL_TESTS = "https://app.statuscake.com/API/SSL"
 
+    # filters of state=list: filter name -> (test list field, kind)
+    FILTERS = {'domain': ('domain', 'glob'),
+               'paused': ('paused', 'bool')}
+
     def __init__(self, module, username, api_key, state, domain, checkrate,
                  contact_group, alert_at, alert_expiry, alert_reminder,
                  alert_broken, alert_mixed):
 
-        self.headers = {"Username": username, "API": api_key}
+        self.client = StatusCakeClient(module, username, api_key)
         self.module = module
         self.state = state
         self.domain = domain
@@ -144,12 +371,51 @@ class StatusCakeSSL:
             }
         }
 
+        # domain -> SSL test map, filled on first lookup or shared by
+        # StatusCakeSSLBulk so that the account list is fetched only once
+        self.ssl_tests = None
+
+        # optional StatusCakeCache of the account SSL test list and the
+        # (id, fields) changes to apply to it
+        self.cache = None
+        self.changes = []
+
+        # TestSelector of the tests returned by state=list
+        self.selector = None
+
+        # optional StatusCakeMirror, also used as cache
+        self.mirror = None
+
+    # SSLRecords of the account SSL test list, built while the list is
+    # parsed unless it has to be cached
+    @staticmethod
+    def fetch_tests(client, cache):
+        tests = cache.get() if cache else None
+        if tests is None and cache:
+            tests = client.get_list(StatusCakeSSL.URL_ALL_TESTS)
+            cache.set(tests)
+        elif tests is None:
+            tests = client.iter_list(StatusCakeSSL.URL_ALL_TESTS)
+        return [SSLRecord(item) for item in tests]
+
+    # the list is parsed while it is downloaded and only the selected
+    # tests are kept, unless it has to be cached. A fresh mirror only
+    # returns the tests matching the domain filter.
     def get_all_tests(self):
-        response = requests.get(self.URL_ALL_TESTS, headers=self.headers)
+        selector = self.selector or TestSelector(None, self.FILTERS)
+        tests = None
+        if self.mirror:
+            tests = self.mirror.candidates(selector.filters, 'domain')
+        if tests is None and self.cache:
+            tests = self.fetch_tests(self.client, self.cache)
+        elif tests is None:
+            tests = self.client.iter_list(self.URL_ALL_TESTS)
+        output, matched = selector.select(tests)
         del self.result['domain']
         del self.result['state']
-        self.result.update({'tests': {'output': response.json(),
-                            'count': len(response.json())}})
+        self.result.update({'tests': {'output': output,
+                            'count': len(output),
+                            'matched': matched}})
 
     def check_response(self, response):
         if response.get('Success'):
@@ -160,34 +426,44 @@ class StatusCakeSSL:
             self.module.fail_json(msg=response)
 
     def check_test(self):
-        response = requests.get(self.URL_ALL_TESTS, headers=self.headers)
-
-        for item in response.json():
-            if item['domain'] == self.domain:
-                return {"alert_at": item['alert_at'],
-                        "alert_broken": item['alert_broken'],
-                        "alert_expiry": item['alert_expiry'],
-                        "alert_reminder": item['alert_reminder'],
-                        "alert_mixed": item['alert_mixed'],
-                        "contact_groups": item['contact_groups'][0],
-                        "domain": item['domain'],
-                        "id": item['id']
-                        }
+        if self.ssl_tests is None:
+            self.ssl_tests = self.map_tests(
+                self.fetch_tests(self.client, self.cache))
+
+        record = self.ssl_tests.get(self.domain)
+        if record is not None:
+            return convert_ssl_test(record)
+
+    # the first test found wins when several tests share the same domain
+    @staticmethod
+    def map_tests(tests):
+        ssl_tests = {}
+        for item in tests:
+            if item['domain'] not in ssl_tests:
+                ssl_tests[item['domain']] = item
+        return ssl_tests
 
     def delete_test(self):
         test = self.check_test()
 
         if not test:
             self.result['response'] = "Test not found on this account"
+        elif test['id'] is None:
+            self.module.fail_json(msg="The id of the SSL test of " +
+                                      self.domain + " created by this " +
+                                      "task is unknown, it can't be deleted")
         else:
             test_id = test['id']
             if self.module.check_mode:
                 self.result['changed'] = True
                 self.result['response'] = ("Deletion successful")
             else:
-                response = requests.delete(self.URL_UPDATE_TEST + "?id=" +
-                                           str(test_id), headers=self.headers)
-                self.check_response(response.json())
+                response = self.client.delete(self.URL_UPDATE_TEST,
+                                              params={'id': test_id})
+                self.check_response(response)
+                if self.result['changed']:
+                    self.ssl_tests.pop(self.domain, None)
+                    self.changes.append((test_id, None))
 
     def create_test(self):
         req_data = self.check_test()
@@ -197,16 +473,24 @@ class StatusCakeSSL:
                 self.result['changed'] = True
                 self.result['response'] = "SSL test inserted"
             else:
-                response = requests.put(self.URL_UPDATE_TEST,
-                                        headers=self.headers,
-                                        data=self.data)
+                response = self.client.put(self.URL_UPDATE_TEST,
+                                           data=self.data)
                 self.result['response'] = "SSL test inserted"
-                self.check_response(response.json())
+                self.check_response(response)
+                # the message of a created test is its id. When it is not,
+                # the cache is dropped.
+                if self.result['changed']:
+                    test_id = response.get('Message')
+                    if not str(test_id).isdigit():
+                        test_id = None
+                    self.ssl_tests[self.domain] = self.list_record(test_id)
+                    self.changes.append((test_id, test_id and
+                                         self.list_record(test_id)))
         else:
             test_id = req_data['id']
-            diffkeys = ([k for k in self.data if k in self.data.keys() and
-                        k != "checkrate" and
-                        str(self.data[k]) != str(req_data[k])])
+            diffkeys = SSL_SCHEMA.diff(SSL_SCHEMA.normalize(self.data),
+                                       SSL_SCHEMA.normalize(req_data, True),
+                                       ('checkrate',))
             if self.module.check_mode:
                 if len(diffkeys) != 0:
                     self.result['changed'] = True
@@ -224,23 +508,299 @@ class StatusCakeSSL:
                 else:
                     self.data.pop('domain')
                     self.data['id'] = test_id
-                    response = requests.put(self.URL_UPDATE_TEST,
-                                            headers=self.headers,
-                                            data=self.data)
-                    self.check_response(response.json())
+                    response = self.client.put(self.URL_UPDATE_TEST,
+                                               data=self.data)
+                    self.check_response(response)
             self.result['diff']['before'] = {k: req_data[k] for k in diffkeys}
             self.result['diff']['after'] = {k: self.data[k] for k in diffkeys}
+            if self.result['changed'] and not self.module.check_mode:
+                self.ssl_tests[self.domain].update(self.list_record(test_id))
+                self.changes.append((test_id, self.list_record(test_id)))
+
+    # record of this test as returned by the account SSL test list
+    def list_record(self, test_id):
+        record = dict((k, v) for k, v in self.data.items()
+                      if v is not None)
+        record['id'] = test_id
+        if 'contact_groups' in record:
+            record['contact_groups'] = [record['contact_groups']]
+        return record
+
+    def save_changes(self):
+        if self.cache and self.changes:
+            self.cache.patch(self.changes, 'id')
+
+    def get_result(self):
+        result = self.result
+        return result
+
+
+class StatusCakeSSLBulk:
+
+    def __init__(self, module, username, api_key, tests, cache=None,
+                 client=None):
+        self.client = client or StatusCakeClient(module, username, api_key)
+        self.module = module
+        self.username = username
+        self.api_key = api_key
+        self.tests = tests
+        self.cache = cache
+        self.changes = []
+
+        self.result = {
+            'changed': False,
+            'results': [],
+            'summary': {
+                'created': 0,
+                'updated': 0,
+                'deleted': 0,
+                'unchanged': 0
+            },
+            'diff': []
+        }
+
+    def reconcile(self):
+        ssl_tests = StatusCakeSSL.map_tests(
+            StatusCakeSSL.fetch_tests(self.client, self.cache))
+
+        processed = []
+        try:
+            for params in self.tests:
+                processed.append(self.process(params, ssl_tests))
+        finally:
+            if self.cache and self.changes:
+                self.cache.patch(self.changes, 'id')
+
+        for test, action in processed:
+            result = test.get_result()
+            if result['changed']:
+                self.result['changed'] = True
+                self.result['summary'][action] += 1
+            else:
+                self.result['summary']['unchanged'] += 1
+
+            self.result['results'].append(result)
+            self.result['diff'].append({
+                'before_header': test.domain,
+                'after_header': test.domain,
+                'before': result['diff']['before'],
+                'after': result['diff']['after']
+            })
+
+    def process(self, params, ssl_tests):
+        test = StatusCakeSSL(self.module, self.username, self.api_key,
+                             **params)
+        test.client = self.client
+        test.ssl_tests = ssl_tests
+        test.changes = self.changes
+        exists = test.domain in ssl_tests
+
+        with timed_test(self.client.metrics, test.domain):
+            if test.state == "absent":
+                test.delete_test()
+                action = 'deleted'
+            else:
+                test.create_test()
+                action = 'updated' if exists else 'created'
+        return test, action
 
     def get_result(self):
         result = self.result
         return result
 
 
+# build the parameters of every item of the tests option, using the module
+# level parameters as defaults and checking them as the module would do
+def bulk_params(module, module_args):
+    tests = []
+    defaults = dict((k, module.params[k]) for k in module_args
+                    if k not in ACCOUNT_PARAMS)
+
+    for item in module.params['tests']:
+        if not isinstance(item, dict):
+            module.fail_json(msg="Each item of tests must be a dictionary, " +
+                                 "got: " + str(item))
+
+        unsupported = [k for k in item if k not in defaults]
+        if unsupported:
+            module.fail_json(msg="Unsupported parameters for tests item " +
+                                 str(item.get('domain')) + ": " +
+                                 ", ".join(sorted(unsupported)))
+
+        params = dict(defaults)
+        for key, value in item.items():
+            try:
+                if value is not None and module_args[key].get('type') == 'int':
+                    value = int(value)
+                elif value is not None and \
+                        module_args[key].get('type') == 'bool':
+                    value = module.boolean(value)
+            except (TypeError, ValueError):
+                module.fail_json(msg="Value of " + key + " for tests item " +
+                                     str(item.get('domain')) + " must be " +
+                                     "of type " + module_args[key]['type'])
+            if key == 'state' and value not in module_args['state']['choices']:
+                module.fail_json(msg="Value of state for tests item " +
+                                     str(item.get('domain')) + " must be " +
+                                     "one of: " +
+                                     ", ".join(module_args['state']['choices']))
+            params[key] = value
+
+        if params['state'] == 'list':
+            module.fail_json(msg="state=list is not supported for tests items")
+        missing = [k for k in REQUIRED_PARAMS[params['state']]
+                   if not params[k]]
+        if missing:
+            module.fail_json(msg="state is " + params['state'] + " but the " +
+                                 "following are missing on tests item " +
+                                 str(params.get('domain')) + ": " +
+                                 ", ".join(missing))
+
+        tests.append(params)
+
+    return tests
+
+
+# manage the SSL tests of an account and return the result of the task
+def account_result(module, module_args, username, api_key, metrics):
+    state = module.params['state']
+    domain = module.params['domain']
+    checkrate = module.params['checkrate']
+    contact_group = module.params['contact_group']
+    alert_at = module.params['alert_at']
+    alert_expiry = module.params['alert_expiry']
+    alert_reminder = module.params['alert_reminder']
+    alert_broken = module.params['alert_broken']
+    alert_mixed = module.params['alert_mixed']
+
+    if module.params['offline']:
+        client = OfflineClient()
+    else:
+        client = StatusCakeClient(module,
+                                  username,
+                                  api_key,
+                                  module.params['connect_timeout'],
+                                  module.params['read_timeout'],
+                                  rate_limit=module.params['rate_limit'],
+                                  max_retries=module.params['max_retries'])
+
+    if module.params['metrics']:
+        client.metrics = metrics
+
+    if module.params['mirror'] and not HAS_SQLITE:
+        module.fail_json(msg="The sqlite3 python module is required for " +
+                             "mirror")
+
+    # offline check mode reads the tests from a snapshot file or from the
+    # cached test list, whatever its age
+    cache = None
+    mirror = None
+    try:
+        if module.params['mirror']:
+            mirror = StatusCakeMirror(module.params['mirror'],
+                                      None if module.params['offline'] else
+                                      module.params['cache_ttl'],
+                                      username,
+                                      'ssl')
+    except StatusCakeError as e:
+        module.fail_json(msg=str(e))
+
+    if module.params['offline']:
+        if not module.check_mode:
+            module.fail_json(msg="offline is only supported in check mode")
+        if module.params['snapshot']:
+            try:
+                snapshot = read_snapshot(module.params['snapshot'])
+            except StatusCakeError as e:
+                module.fail_json(msg=str(e))
+            cache = SnapshotCache([ssl_list_item(item) for item in
+                                   snapshot.get('ssl') or []], 'id')
+        elif mirror:
+            cache = mirror
+            mirror = None
+        elif module.params['cache_dir']:
+            cache = StatusCakeCache(module.params['cache_dir'],
+                                    None,
+                                    username,
+                                    StatusCakeSSL.URL_ALL_TESTS)
+        else:
+            module.fail_json(msg="offline requires snapshot, mirror or " +
+                                 "cache_dir")
+    elif mirror:
+        cache = mirror
+    elif module.params['cache_dir']:
+        cache = StatusCakeCache(module.params['cache_dir'],
+                                module.params['cache_ttl'],
+                                username,
+                                StatusCakeSSL.URL_ALL_TESTS)
+    if cache:
+        cache.metrics = client.metrics
+
+    if module.params['tests']:
+        bulk = StatusCakeSSLBulk(module,
+                                 username,
+                                 api_key,
+                                 bulk_params(module, module_args),
+                                 cache,
+                                 client)
+        try:
+            bulk.reconcile()
+        except StatusCakeError as e:
+            module.fail_json(msg=str(e))
+        result = bulk.get_result()
+        result['api_calls'] = client.calls
+        result['throttled_time'] = round(client.throttled, 3)
+        return result
+
+    test = StatusCakeSSL(module,
+                         username,
+                         api_key,
+                         state,
+                         domain,
+                         checkrate,
+                         contact_group,
+                         alert_at,
+                         alert_expiry,
+                         alert_reminder,
+                         alert_broken,
+                         alert_mixed)
+    test.client = client
+    test.cache = cache
+    test.mirror = mirror
+
+    try:
+        if state == "list":
+            test.selector = TestSelector(module.params['filter'],
+                                         test.FILTERS,
+                                         module.params['fields'],
+                                         module.params['limit'],
+                                         module.params['offset'])
+        if state == "absent":
+            with timed_test(client.metrics, test.domain):
+                test.delete_test()
+        if state == "present":
+            with timed_test(client.metrics, test.domain):
+                test.create_test()
+        if state == "list":
+            test.get_all_tests()
+        test.save_changes()
+    except StatusCakeError as e:
+        module.fail_json(msg=str(e))
+
+    result = test.get_result()
+    result['api_calls'] = client.calls
+    result['throttled_time'] = round(client.throttled, 3)
+    return result
+
+
 def run_module():
+    metrics = Metrics()
 
     module_args = dict(
         username=dict(type='str', required=False),
         api_key=dict(type='str', required=False),
+        accounts=dict(type='raw', required=False),
+        account_concurrency=dict(type='int', required=False, default=10),
         state=dict(choices=['absent', 'present', 'list'], default='present'),
         domain=dict(type='str', required=False),
         checkrate=dict(type='int', required=False, default=3600),
@@ -249,29 +809,63 @@ def run_module():
         alert_expiry=dict(type='bool', required=False, default=True),
         alert_reminder=dict(type='bool', required=False, default=True),
         alert_broken=dict(type='bool', required=False, default=True),
-        alert_mixed=dict(type='bool', required=False, default=True)
+        alert_mixed=dict(type='bool', required=False, default=True),
+        tests=dict(type='list', required=False),
+        cache_dir=dict(type='path', required=False),
+        cache_ttl=dict(type='int', required=False, default=300),
+        mirror=dict(type='path', required=False),
+        connect_timeout=dict(type='int', required=False, default=10),
+        read_timeout=dict(type='int', required=False, default=60),
+        rate_limit=dict(type='float', required=False),
+        max_retries=dict(type='int', required=False, default=5),
+        filter=dict(type='dict', required=False),
+        fields=dict(type='list', required=False),
+        limit=dict(type='int', required=False),
+        offset=dict(type='int', required=False, default=0),
+        metrics=dict(type='bool', required=False, default=False),
+        offline=dict(type='bool', required=False, default=False),
+        snapshot=dict(type='path', required=False),
     )
 
     module = AnsibleModule(
             argument_spec=module_args,
             supports_check_mode=True,
-            required_if=[
-              ["state", "present", ["domain", "contact_group"]],
-              ["state", "absent", ["domain"]],
+            mutually_exclusive=[
+              ["tests", "domain"],
+              ["accounts", "username"],
+              ["accounts", "api_key"]
             ]
             )
 
+    # domain and contact_group are only required when a single SSL test is
+    # managed
+    if not module.params['tests']:
+        required = REQUIRED_PARAMS.get(module.params['state'], [])
+        missing = [k for k in required if not module.params[k]]
+        if missing:
+            module.fail_json(msg="state is " + module.params['state'] +
+                                 " but all of the following are missing: " +
+                                 ", ".join(missing))
+
+    if module.params['accounts']:
+        try:
+            accounts = account_credentials(module.params['accounts'])
+        except StatusCakeError as e:
+            module.fail_json(msg=str(e))
+        result = run_accounts(
+            lambda worker, username, api_key: account_result(
+                worker, module_args, username, api_key, metrics),
+            module, accounts, module.params['account_concurrency'])
+        if module.params['metrics']:
+            result['metrics'] = metrics.result()
+        if result['failed_accounts']:
+            module.fail_json(msg="Failed StatusCake accounts: " +
+                                 ", ".join(result['failed_accounts']),
+                             **result)
+        module.exit_json(**result)
+
     username = module.params['username']
     api_key = module.params['api_key']
-    state = module.params['state']
-    domain = module.params['domain']
-    checkrate = module.params['checkrate']
-    contact_group = module.params['contact_group']
-    alert_at = module.params['alert_at']
-    alert_expiry = module.params['alert_expiry']
-    alert_reminder = module.params['alert_reminder']
-    alert_broken = module.params['alert_broken']
-    alert_mixed = module.params['alert_mixed']
 
     if not (username and api_key) and \
             os.environ.get('STATUSCAKE_USERNAME') and \
@@ -279,33 +873,16 @@ def run_module():
         username = os.environ.get('STATUSCAKE_USERNAME')
         api_key = os.environ.get('STATUSCAKE_API_KEY')
     if not (username and api_key) and \
+            not (module.params['offline'] and module.params['snapshot']) and \
             not (os.environ.get('STATUSCAKE_USERNAME') and \
             os.environ.get('STATUSCAKE_API_KEY')):
         module.fail_json(msg="You must set STATUSCAKE_USERNAME and " +
                              "STATUSCAKE_API_KEY environment variables " +
                              "or set username/api_key module arguments")
 
-    test = StatusCakeSSL(module,
-                         username,
-                         api_key,
-                         state,
-                         domain,
-                         checkrate,
-                         contact_group,
-                         alert_at,
-                         alert_expiry,
-                         alert_reminder,
-                         alert_broken,
-                         alert_mixed)
-
-    if state == "absent":
-        test.delete_test()
-    if state == "present":
-        test.create_test()
-    if state == "list":
-        test.get_all_tests()
-
-    result = test.get_result()
+    result = account_result(module, module_args, username, api_key, metrics)
+    if module.params['metrics']:
+        result['metrics'] = metrics.result()
     module.exit_json(**result)
 
 
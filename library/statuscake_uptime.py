@@ -24,8 +24,6 @@ module: statuscake_uptime
 short_description: Manage StatusCake uptime tests
 description:
     - Manage StatusCake uptime tests by using StatusCake REST API.
-requirements:
-  - "requests >= 2.18.0"
 version_added: "2.2"
 author: "Raphael Pereira Ribeiro (@raphapr)"
 options:
@@ -37,27 +35,52 @@ options:
     description:
       - StatusCake API KEY. Can also be supplied via $STATUSCAKE_API_KEY env variable.
     required: false
+  accounts:
+    description:
+      - Manage the same tests in several StatusCake accounts at the same
+        time, instead of username and api_key.
+      - A list of dictionaries with the username, api_key and an optional
+        name of each account (the username by default), or a dictionary of
+        the username and api_key by account name.
+      - Each account has its own client, rate limit and cache. The results
+        are returned by account name.
+    required: false
+  account_concurrency:
+    description:
+      - Maximum number of accounts managed at the same time.
+    default: 10
+    required: false
   name:
     description:
-      - Name of the test. It must be unique.
+      - Name of the test. It must be unique, a warning is shown when several
+        tests of the account share the name and the first one is used.
+    required: false
+  test_id:
+    description:
+      - ID of the test. Identifies the test instead of its name, which can
+        then be changed.
     required: false
   url:
     description:
       - Website URL, either an IP or a FQDN.
+      - Identifies the test to delete when neither name nor test_id is set.
     required: false
   state:
     description:
       - Attribute that specifies if the test has to be created, deleted or a basic list of all tests.
+      - paused and unpaused pause or unpause every test matching filter,
+        read from a single account test list. Only the tests not already
+        in this state are updated, up to concurrency at the same time.
     required: false
     default: present
-    choices: ['present', 'absent', 'list']
+    choices: ['present', 'absent', 'list', 'paused', 'unpaused']
   test_tags:
     description:
       - Website URL, either an IP or a FQDN.
     required: false
   check_rate:
     description:
-  - The number of seconds between checks.
+      - The number of seconds between checks.
     default: 300
     required: false
   test_type:
@@ -134,6 +157,162 @@ options:
   basic_pass:
     description:
       - If BasicUser is set then this should be the password for the BasicUser
+      - The API never returns the password, so it can't be compared and the
+        update is sent on every run where basic_pass is set (with
+        fingerprint_ttl, only when the fingerprint of the test doesn't match).
+    required: false
+  tests:
+    description:
+      - List of tests to manage in a single task. Each item accepts the same
+        options as the module itself (name, url, state, check_rate, ...).
+        Options set at the module level are used as defaults for every item.
+      - The account test list is fetched only once for the whole list.
+      - Mutually exclusive with name.
+    required: false
+  cache_dir:
+    description:
+      - Directory where the account test list is cached between tasks.
+        The cache is shared by every task and fork using the same directory
+        and is kept up to date with the changes made by the module.
+      - The cache is disabled when not set.
+    required: false
+  cache_ttl:
+    description:
+      - Number of seconds the cached test list can be used before it is
+        downloaded again.
+    default: 300
+    required: false
+  mirror:
+    description:
+      - SQLite database mirroring the account test list and the test
+        details, created when missing. It replaces the cache_dir cache of
+        the test list and can be shared by every task, fork and account.
+      - The mirror is refreshed when it is older than cache_ttl. The test
+        list is downloaded and only the new and changed tests are written,
+        their details are downloaded again when they are needed. The
+        lookups and state=list use the indexes of the mirror.
+      - Requires the sqlite3 python module. The mirror is disabled when not
+        set.
+    required: false
+  fingerprint_ttl:
+    description:
+      - Number of seconds a test is known to be up to date once it has been
+        written or compared. A fingerprint of the desired state of the test
+        is stored in cache_dir, and the test is not read from the API again
+        while its desired state keeps the same fingerprint. Changes made
+        outside of Ansible are not seen before the fingerprint expires.
+      - Requires cache_dir. Fingerprints are disabled when not set.
+    required: false
+  connect_timeout:
+    description:
+      - Number of seconds to wait for the connection to the StatusCake API.
+      - The connection and the responses share a single timeout, the
+        greater of connect_timeout and read_timeout.
+    default: 10
+    required: false
+  read_timeout:
+    description:
+      - Number of seconds to wait for a response of the StatusCake API.
+    default: 60
+    required: false
+  rate_limit:
+    description:
+      - Maximum number of requests per second sent to the StatusCake API.
+        The limit is shared by every task and fork using the same account
+        on the host running the module.
+      - No limit is applied when not set.
+    required: false
+  max_retries:
+    description:
+      - Number of times a throttled request (HTTP 429 or 503) is retried,
+        after the Retry-After delay or an exponential backoff.
+    default: 5
+    required: false
+  filter:
+    description:
+      - With state=list, only return the tests matching every filter of
+        this dictionary. Supported filters are name (shell pattern), tag,
+        status (Up or Down), paused (boolean) and test_type.
+      - Required with state=paused and unpaused, the tests paused or
+        unpaused.
+    required: false
+  fields:
+    description:
+      - With state=list, list of the fields returned for each test. Every
+        field is returned when not set.
+    required: false
+  limit:
+    description:
+      - With state=list, maximum number of tests returned.
+    required: false
+  offset:
+    description:
+      - With state=list, number of matching tests skipped before the first
+        returned test.
+    default: 0
+    required: false
+  trust_list:
+    description:
+      - The test details are only downloaded when an option that is not
+        returned by the account test list (find_string, custom_header, ...)
+        is set. Default values of those options are only compared when the
+        test details are downloaded.
+      - With trust_list, the test is always compared with the account test
+        list (or its cache) only, and the options not returned by the test
+        list are never considered as changed.
+    default: false
+    required: false
+  concurrency:
+    description:
+      - Number of tests of the tests option handled at the same time. The
+        test details requests and the updates of independent tests are sent
+        in parallel, up to this number, 1 by default.
+      - With state=paused or unpaused, number of tests updated at the same
+        time, 10 by default.
+    required: false
+  exclusive:
+    description:
+      - With tests, delete the tests of the account that are not declared in
+        tests, within the scope set by exclusive_tag and exclusive_prefix.
+        The account test list is fetched once and the deletions are sent in
+        parallel, up to concurrency.
+    default: false
+    required: false
+  exclusive_tag:
+    description:
+      - With exclusive, only delete undeclared tests having this tag.
+    required: false
+  exclusive_prefix:
+    description:
+      - With exclusive, only delete undeclared tests whose name starts with
+        this prefix.
+    required: false
+  max_deletes:
+    description:
+      - With exclusive, the task fails without deleting anything when more
+        than this number of tests would be deleted.
+    default: 10
+    required: false
+  metrics:
+    description:
+      - Return the performance metrics of the task, see the metrics return
+        value.
+    default: false
+    required: false
+  offline:
+    description:
+      - Run check mode without any request to the StatusCake API. The tests
+        of the account are read from the snapshot file, or from the cached
+        test list of the mirror or of cache_dir whatever its age.
+      - Only supported in check mode.
+      - Without snapshot, the tests are compared as with trust_list.
+    default: false
+    required: false
+  snapshot:
+    description:
+      - With offline, snapshot file written by statuscake_snapshot
+        (state=export) to read the tests from. The credentials are not
+        needed with a snapshot file.
     required: false
 '''
 
@@ -165,11 +344,107 @@ EXAMPLES = '''
     basic_user: "my_username"
     basic_pass: "my_password"
 
+- name: Manage several statuscake tests at once
+  statuscake_uptime:
+    username: user
+    api_key: api
+    check_rate: 300
+    contact_group: 0
+    tests:
+      - name: "MyWebSite"
+        url: "https://www.example.com"
+      - name: "MyApi"
+        url: "https://api.example.com"
+        check_rate: 60
+      - name: "OldWebSite"
+        state: absent
+
 - name: List all statuscake tests
   statuscake_uptime:
     username: user
     api_key: api
     state: list
+
+- name: List the names and IDs of the paused tests tagged production
+  statuscake_uptime:
+    username: user
+    api_key: api
+    state: list
+    filter:
+      tag: production
+      paused: true
+    fields: [TestID, WebsiteName]
+    limit: 100
+
+- name: Manage the production tests and delete the undeclared ones
+  statuscake_uptime:
+    username: user
+    api_key: api
+    exclusive: true
+    exclusive_tag: production
+    max_deletes: 5
+    concurrency: 4
+    tests:
+      - name: "MyWebSite"
+        url: "https://www.google.com"
+        test_tags: production
+      - name: "MyApi"
+        url: "https://api.example.com"
+        test_tags: production
+
+# no API request at all for the tests unchanged for up to an hour
+- name: Manage statuscake tests with fingerprints
+  statuscake_uptime:
+    cache_dir: /tmp/statuscake
+    fingerprint_ttl: 3600
+    tests:
+      - name: "MyWebSite"
+        url: "https://www.google.com"
+      - name: "MyApi"
+        url: "https://api.example.com"
+
+# pause the tests of a maintenance window, and unpause them after it
+- name: Pause the production web tests
+  statuscake_uptime:
+    username: user
+    api_key: api
+    state: paused
+    filter:
+      tag: production
+      name: "web-*"
+    concurrency: 20
+
+- name: Unpause the production web tests
+  statuscake_uptime:
+    username: user
+    api_key: api
+    state: unpaused
+    filter:
+      tag: production
+      name: "web-*"
+
+# the same tests in several accounts, managed at the same time
+- name: Manage statuscake tests in several accounts
+  statuscake_uptime:
+    accounts:
+      production:
+        username: prod-user
+        api_key: prod-api
+      staging:
+        username: staging-user
+        api_key: staging-api
+    tests:
+      - name: "MyWebSite"
+        url: "https://www.google.com"
+
+# run with --check, e.g. in CI, against a statuscake_snapshot export
+- name: Dry-run statuscake test without any API request
+  statuscake_uptime:
+    name: "MyWebSite"
+    url: "https://www.google.com"
+    check_rate: 300
+    offline: true
+    snapshot: statuscake.json
 '''
 
 RETURN = '''
@@ -201,12 +476,62 @@ tests:
             type: dictionary
             sample: {"ContactGroup": ["0"], "NormalisedResponse": 0, "Paused": true, "Public": 0, "Status": "Up", "TestID": 2554887, "TestType": "HTTP", "Uptime": null, "WebsiteName": "MyWebsite"}
         count:
-            description: Total number of tests
+            description: Number of tests returned
             returned: success
             type: int
             sample: 25
+        matched:
+            description: Number of tests matching the filter, before limit and offset
+            returned: success
+            type: int
+            sample: 120
+results:
+    description: Result of each test, in the same order as the tests option. With state=paused or unpaused, result of each test matching filter.
+    returned: success, when tests is set or state is paused or unpaused
+    type: list
+    sample: [{"changed": true, "name": "MyWebSite", "state": "present", "response": "Test updated", "diff": {"before": {"CheckRate": 600}, "after": {"CheckRate": 300}}}]
+summary:
+    description: Number of tests created, updated, deleted, left unchanged and deleted by exclusive. With state=paused or unpaused, number of tests updated and already in this state.
+    returned: success, when tests is set or state is paused or unpaused
+    type: dictionary
+    sample: {"created": 1, "updated": 2, "deleted": 0, "unchanged": 40, "pruned": 1}
+duration:
+    description: Number of seconds spent pausing or unpausing the tests, from the read of the account test list to the last update.
+    returned: success, when state is paused or unpaused
+    type: float
+    sample: 1.84
+pruned:
+    description: Tests deleted (or to delete in check mode) by exclusive.
+    returned: success, when exclusive is set
+    type: list
+    sample: [{"changed": true, "name": "OldWebSite", "test_id": 1234, "state": "absent", "response": "This Check Has Been Deleted. It can not be recovered."}]
+accounts:
+    description: Result of each account by account name, with the same return values as a task managing a single account, or failed and msg when the account failed.
+    returned: success, when accounts is set
+    type: dictionary
+    sample: {"production": {"changed": true, "results": [{"changed": true, "name": "MyWebSite", "state": "present"}], "api_calls": 3, "throttled_time": 0.0}, "staging": {"failed": true, "msg": "Invalid API key"}}
+failed_accounts:
+    description: Names of the accounts that failed.
+    returned: when accounts is set
+    type: list
+    sample: ["staging"]
+api_calls:
+    description: Number of requests sent to the StatusCake API by the task, for all the accounts when accounts is set.
+    returned: success
+    type: int
+    sample: 3
+throttled_time:
+    description: Number of seconds spent waiting for the rate limit or before retrying throttled requests.
+    returned: success
+    type: float
+    sample: 1.5
+metrics:
+    description: Performance metrics of the task, returned when the metrics option is set. Runtime of the module, HTTP calls with their total, maximum and individual times (in seconds) and response sizes (in bytes) per endpoint, time spent parsing JSON responses, cache hits and misses and the slowest tests of the task.
+    returned: success, when metrics is set
+    type: dictionary
+    sample: {"runtime": 1.284, "http_calls": 2, "http_time": 1.052, "bytes": 18342, "parse_time": 0.004, "cache": {"hits": 0, "misses": 1}, "endpoints": {"GET /API/Tests": {"calls": 1, "time": 0.811, "max_time": 0.811, "bytes": 18290, "times": [0.811]}, "PUT /API/Tests/Update": {"calls": 1, "time": 0.241, "max_time": 0.241, "bytes": 52, "times": [0.241]}}, "slowest_tests": [{"test": "MyWebSite", "time": 0.245}]}
 diff:
-    description: Show the fields before and after each change
+    description: Show the fields before and after each change. A list with one entry per test when tests is set, followed by one entry per test deleted by exclusive, or per test paused or unpaused.
     returned: always
     type: dictionary
     contains:
@@ -223,8 +548,49 @@ diff:
 
 '''
 
-import requests
-from ansible.module_utils.basic import *
+import os
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.statuscake import (FingerprintStore,
+                                             HAS_SQLITE,
+                                             Metrics,
+                                             OfflineClient,
+                                             SnapshotCache,
+                                             StatusCakeCache,
+                                             StatusCakeClient,
+                                             StatusCakeError,
+                                             StatusCakeMirror,
+                                             TestSelector,
+                                             UPTIME_SCHEMA,
+                                             UptimeIndex,
+                                             UptimeRecord,
+                                             WorkerModule,
+                                             account_credentials,
+                                             convert_uptime_details,
+                                             normalize_record,
+                                             read_snapshot,
+                                             run_accounts,
+                                             run_concurrently,
+                                             split_tags,
+                                             timed_test)
+
+
+# for each state, groups of parameters of which at least one must be set
+REQUIRED_PARAMS = {'present': [['url'], ['name', 'test_id']],
+                   'absent': [['name', 'test_id', 'url']],
+                   'paused': [['filter']],
+                   'unpaused': [['filter']]}
+
+# parameters that apply to the whole task rather than to a single test
+ACCOUNT_PARAMS = ('username', 'api_key', 'accounts', 'account_concurrency',
+                  'tests', 'cache_dir', 'cache_ttl',
+                  'mirror', 'fingerprint_ttl',
+                  'connect_timeout', 'read_timeout', 'trust_list',
+                  'concurrency', 'rate_limit', 'max_retries', 'filter',
+                  'fields', 'limit', 'offset', 'metrics',
+                  'offline', 'snapshot', 'exclusive', 'exclusive_tag',
+                  'exclusive_prefix', 'max_deletes')
 
 
 class StatusCakeUptime:
@@ -232,15 +598,31 @@ class StatusCakeUptime:
     URL_ALL_TESTS = "https://app.statuscake.com/API/Tests"
     URL_DETAILS_TEST = "https://app.statuscake.com/API/Tests/Details"
 
+    # fields of a test also returned by the account test list
+    LIST_FIELDS = ('WebsiteName', 'WebsiteURL', 'TestType', 'Paused',
+                   'ContactGroup', 'CheckRate', 'TestTags')
+
+    # filters of state=list: filter name -> (test list field, kind)
+    FILTERS = {'name': ('WebsiteName', 'glob'),
+               'tag': ('TestTags', 'tag'),
+               'status': ('Status', 'equal'),
+               'paused': ('Paused', 'bool'),
+               'test_type': ('TestType', 'equal')}
+
+    # fields sent to the API but never returned by it
+    WRITE_ONLY_FIELDS = ('TestID', 'BasicPass')
+
     def __init__(self, module, username, api_key, name, url, state,
                  test_tags, check_rate, test_type, port, contact_group, paused,
                  node_locations, confirmation, timeout, status_codes, host,
                  custom_header, follow_redirect, find_string, do_not_find,
-                 post_raw, trigger_rate, basic_user, basic_pass):
+                 post_raw, trigger_rate, basic_user, basic_pass,
+                 test_id=None):
 
-        self.headers = {"Username": username, "API": api_key}
+        self.client = StatusCakeClient(module, username, api_key)
         self.module = module
         self.name = name
+        self.test_id = test_id
         self.url = url
         self.state = state
         self.test_tags = test_tags
@@ -262,17 +644,23 @@ class StatusCakeUptime:
         self.basic_user = basic_user
         self.basic_pass = basic_pass
 
+        # fields set by the module defaults rather than by the user
+        self.defaults = set()
+
         if not check_rate:
             self.check_rate = 300
+            self.defaults.add('CheckRate')
         else:
             self.check_rate = check_rate
 
         if not test_type:
             self.test_type = "HTTP"
+            self.defaults.add('TestType')
         else:
             self.test_type = test_type
         if trigger_rate is None:
             self.trigger_rate = 5
+            self.defaults.add('TriggerRate')
         else:
             self.trigger_rate = trigger_rate
 
@@ -313,12 +701,62 @@ class StatusCakeUptime:
             }
         }
 
+        # UptimeIndex of the account test list, built on first lookup or
+        # shared by StatusCakeUptimeBulk so that the account list is fetched
+        # only once
+        self.index = None
+
+        # compare with the test list record instead of the test details
+        self.trust_list = False
+
+        # optional StatusCakeCache of the account test list and the
+        # (TestID, fields) changes to apply to it
+        self.cache = None
+        self.changes = []
+
+        # TestSelector of the tests returned by state=list
+        self.selector = None
+
+        # SnapshotCache giving the test details in offline check mode
+        self.details = None
+
+        # optional FingerprintStore of the tests known to be up to date
+        self.fingerprints = None
+
+        # optional StatusCakeMirror, also used as cache, keeping the test
+        # details
+        self.mirror = None
+
+    # UptimeRecords of the account test list, built while the list is
+    # parsed unless it has to be cached
+    @staticmethod
+    def fetch_tests(client, cache):
+        tests = cache.get() if cache else None
+        if tests is None and cache:
+            tests = client.get_list(StatusCakeUptime.URL_ALL_TESTS)
+            cache.set(tests)
+        elif tests is None:
+            tests = client.iter_list(StatusCakeUptime.URL_ALL_TESTS)
+        return [UptimeRecord(item) for item in tests]
+
+    # the list is parsed while it is downloaded and only the selected
+    # tests are kept, unless it has to be cached. A fresh mirror only
+    # returns the tests matching the name and tag filters.
     def get_all_tests(self):
-        response = requests.get(self.URL_ALL_TESTS, headers=self.headers)
+        selector = self.selector or TestSelector(None, self.FILTERS)
+        tests = None
+        if self.mirror:
+            tests = self.mirror.candidates(selector.filters, 'name', 'tag')
+        if tests is None and self.cache:
+            tests = self.fetch_tests(self.client, self.cache)
+        elif tests is None:
+            tests = self.client.iter_list(self.URL_ALL_TESTS)
+        output, matched = selector.select(tests)
         del self.result['name']
         del self.result['state']
-        self.result.update({'tests': {'output': response.json(),
-                            'count': len(response.json())}})
+        self.result.update({'tests': {'output': output,
+                            'count': len(output),
+                            'matched': matched}})
 
     def check_response(self, response):
         self.result['response'] = response['Message']
@@ -335,131 +773,584 @@ class StatusCakeUptime:
             self.module.fail_json(msg=errormsg)
 
     def check_test(self):
-        response = requests.get(self.URL_ALL_TESTS, headers=self.headers)
+        record = self.find_test()
+        if record:
+            return record['TestID']
+
+    # record of the test in the account test list, by test_id, name or url
+    def find_test(self):
+        if self.index is None:
+            self.index = UptimeIndex(self.fetch_tests(self.client, self.cache))
+
+        if self.name and not self.test_id:
+            named = self.index.named(self.name)
+            if len(named) > 1:
+                self.module.warn("Several tests are named " + self.name +
+                                 " (TestID " +
+                                 ", ".join(str(item['TestID'])
+                                           for item in named) +
+                                 "), using the first one. Set test_id to " +
+                                 "choose the test.")
+
+        return self.index.find(self.test_id, self.name, self.url)
+
+    # name of the test in the messages and diffs
+    def label(self):
+        return self.name or str(self.test_id or self.url)
+
+    # key of the test in the FingerprintStore, as it is found in the index
+    def fingerprint_key(self):
+        if self.test_id:
+            return "TestID " + str(self.test_id)
+        if self.name:
+            return "WebsiteName " + self.name
+        return "WebsiteURL " + str(self.url)
+
+    # keys under which the fingerprint of a test of the account test list
+    # may be stored, whichever identifier its task used
+    @staticmethod
+    def fingerprint_keys(record):
+        return ["TestID " + str(record['TestID']),
+                "WebsiteName " + str(record.get('WebsiteName')),
+                "WebsiteURL " + str(record.get('WebsiteURL'))]
+
+    # fingerprint of the desired state, None when it is not stored or when
+    # the test is up to date with it
+    def check_fingerprint(self):
+        if not self.fingerprints:
+            return None
+        fingerprint = self.fingerprints.fingerprint(self.data)
+        if self.fingerprints.match(self.fingerprint_key(), fingerprint):
+            self.result['response'] = ("No data has been updated " +
+                                       "(same fingerprint)")
+            return None
+        return fingerprint
 
-        for item in response.json():
-            if item['WebsiteName'] == self.name:
-                return item['TestID']
+    # the test is up to date with the desired state of this fingerprint
+    def save_fingerprint(self, fingerprint, test_id):
+        if fingerprint and not self.module.check_mode:
+            self.fingerprints.set(self.fingerprint_key(), fingerprint,
+                                  test_id)
 
     def delete_test(self):
-        test_id = self.check_test()
+        record = self.find_test()
+        if self.fingerprints and not self.module.check_mode:
+            self.fingerprints.discard(self.fingerprint_key())
+            if record:
+                for key in self.fingerprint_keys(record):
+                    self.fingerprints.discard(key)
 
-        if not test_id:
+        if not record:
             self.result['response'] = "This Check doesn't exists"
         else:
+            test_id = record['TestID']
             data = {'TestID': test_id}
             if self.module.check_mode:
                 self.result['changed'] = True
                 self.result['response'] = ("This Check Has Been Deleted. " +
                                            "It can not be recovered.")
             else:
-                response = requests.delete(self.URL_DETAILS_TEST,
-                                           headers=self.headers, data=data)
-                self.check_response(response.json())
+                response = self.client.delete(self.URL_DETAILS_TEST,
+                                              data=data)
+                self.check_response(response)
+                if self.result['changed']:
+                    self.index.remove(record)
+                    self.changes.append((test_id, None))
 
     def create_test(self):
-        test_id = self.check_test()
+        fingerprint = self.check_fingerprint()
+        if self.fingerprints and not fingerprint:
+            return
+        record = self.find_test()
 
-        if not test_id:
+        if not record and self.test_id:
+            self.module.fail_json(msg="Test ID " + str(self.test_id) +
+                                      " not found on this account")
+        elif not record:
             if self.module.check_mode:
                 self.result['changed'] = True
                 self.result['response'] = "Test inserted"
             else:
-                response = requests.put(self.URL_UPDATE_TEST,
-                                        headers=self.headers,
-                                        data=self.data)
-                self.check_response(response.json())
+                response = self.client.put(self.URL_UPDATE_TEST,
+                                           data=self.data)
+                self.check_response(response)
+                if self.result['changed']:
+                    test_id = response.get('InsertID')
+                    if test_id:
+                        self.index.add(self.list_record(test_id))
+                    self.changes.append((test_id, self.list_record(test_id)))
+                    self.save_fingerprint(fingerprint, test_id)
         else:
+            test_id = record['TestID']
             self.data['TestID'] = test_id
-            url_details_test = (self.URL_DETAILS_TEST +
-                                "/?TestID=" +
-                                str(test_id))
-            response = requests.get(url_details_test, headers=self.headers)
-            req_data = self.convert(response.json())
-            diffkeys = ([k for k in self.data if self.data[k] and k in req_data and
-                        str(self.data[k]) != str(req_data[k])])
-            if self.module.check_mode:
-                if len(diffkeys) != 0:
-                    self.result['changed'] = True
-                    self.result['response'] = "Test updated"
-                else:
-                    self.result['response'] = ("No data has been updated " +
-                                               "(is any data different?) " +
-                                               "Given: "+str(test_id))
+            # the test details are only needed for the fields set by the
+            # user and not returned by the account test list
+            req_data = self.convert_record(record)
+            missing = [k for k in self.data if self.data[k] is not None and
+                       k not in req_data and k not in self.defaults and
+                       k not in self.WRITE_ONLY_FIELDS]
+            if missing and not self.trust_list:
+                req_data = self.get_details(test_id)
+            diffkeys = UPTIME_SCHEMA.diff(UPTIME_SCHEMA.normalize(self.data),
+                                          UPTIME_SCHEMA.normalize(req_data,
+                                                                  True))
+            # the API never returns the password, so it can't be compared
+            # and the test is updated whenever it is set
+            if len(diffkeys) == 0 and self.data.get('BasicPass') is None:
+                self.result['response'] = ("No data has been updated " +
+                                           "(is any data different?) " +
+                                           "Given: "+str(test_id))
+                self.save_fingerprint(fingerprint, test_id)
+            elif self.module.check_mode:
+                self.result['changed'] = True
+                self.result['response'] = "Test updated"
             else:
-                response = requests.put(self.URL_UPDATE_TEST,
-                                        headers=self.headers,
-                                        data=self.data)
-                self.check_response(response.json())
+                response = self.client.put(self.URL_UPDATE_TEST,
+                                           data=self.data)
+                self.check_response(response)
+                if self.result['changed']:
+                    self.index.update(record, self.list_record(test_id))
+                    self.changes.append((test_id, self.list_record(test_id)))
+                    self.save_fingerprint(fingerprint, test_id)
             self.result['diff']['before'] = {k: req_data[k] for k in diffkeys}
             self.result['diff']['after'] = {k: self.data[k] for k in diffkeys}
 
-    # convert data returned by request to a similar and comparable estruture
-    def convert(self, req_data):
-        req_data['WebsiteURL'] = req_data.pop('URI', None)
-        req_data['TestTags'] = req_data.pop('Tags', None)
-        req_data['ContactGroup'] = (req_data['ContactGroups'][0]['ID']
-                                    if req_data['ContactGroup'] else None)
-        req_data = ({k: req_data[k] for k in req_data.keys()
-                    if k in self.data.keys()})
-        for key in req_data.keys():
-            if type(req_data[key]) is list:
-                req_data[key] = [item.encode('UTF8') for item in req_data[key]]
-                req_data[key] = ','.join(req_data[key])
-            if type(req_data[key]) is unicode:
-                req_data[key] = req_data[key].encode('UTF-8')
-            if req_data[key] is True:
-                req_data[key] = 1
-            if req_data[key] is False:
-                req_data[key] = 0
-        return req_data
+    # comparable details of a test, from the API or from the snapshot of
+    # offline check mode
+    def get_details(self, test_id):
+        if self.details is not None:
+            record = self.details.details(test_id) or {}
+            return dict((k, v) for k, v in record.items() if k in self.data)
+        response = self.mirror.details(test_id) if self.mirror else None
+        if response is None:
+            response = self.client.get(self.URL_DETAILS_TEST,
+                                       params={'TestID': test_id})
+            if self.mirror:
+                self.mirror.set_details(test_id, response)
+        return convert_uptime_details(response, self.data)
+
+    # record of this test as returned by the account test list
+    def list_record(self, test_id):
+        record = dict((k, self.data[k]) for k in self.LIST_FIELDS
+                      if self.data.get(k) is not None)
+        record['TestID'] = test_id
+        if 'Paused' in record:
+            record['Paused'] = bool(record['Paused'])
+        if 'ContactGroup' in record:
+            record['ContactGroup'] = str(record['ContactGroup']).split(',')
+        if 'TestTags' in record:
+            record['TestTags'] = split_tags(record['TestTags'])
+        return record
+
+    def save_changes(self):
+        if self.cache and self.changes:
+            self.cache.patch(self.changes, 'TestID')
+
+    # update form fields of a record of the account test list, which only
+    # knows the LIST_FIELDS of a test
+    def convert_record(self, record):
+        req_data = dict((k, record[k]) for k in self.LIST_FIELDS
+                        if k in record)
+        return normalize_record(req_data)
 
     def get_result(self):
         result = self.result
         return result
 
 
-def run_module():
+class StatusCakeUptimeBulk:
 
-    module_args = dict(
-        username=dict(type='str', required=False),
-        api_key=dict(type='str', required=False),
-        name=dict(type='str', required=False),
-        url=dict(type='str', required=False),
-        state=dict(choices=['absent', 'present', 'list'], default='present'),
-        test_tags=dict(type='str', required=False),
-        check_rate=dict(type='int', required=False),
-        test_type=dict(type='str', required=False),
-        port=dict(type='int', required=False),
-        contact_group=dict(type='str', required=False),
-        paused=dict(type='int', required=False),
-        node_locations=dict(type='str', required=False),
-        confirmation=dict(type='int', required=False),
-        timeout=dict(type='int', required=False),
-        status_codes=dict(type='str', required=False),
-        host=dict(type='str', required=False),
-        custom_header=dict(type='str', required=False),
-        follow_redirect=dict(type='int', required=False),
-        find_string=dict(type='str', required=False),
-        do_not_find=dict(type='int', required=False),
-        post_raw=dict(type='str', required=False),
-        trigger_rate=dict(type='int', required=False),
-        basic_user=dict(type='str', required=False),
-        basic_pass=dict(type='str', required=False, no_log=True),
-    )
+    def __init__(self, module, username, api_key, tests, cache=None,
+                 client=None):
+        self.client = client or StatusCakeClient(module, username, api_key)
+        self.module = module
+        self.username = username
+        self.api_key = api_key
+        self.tests = tests
+        self.cache = cache
+        self.changes = []
+        self.trust_list = False
+        self.concurrency = 1
+        self.details = None
+        self.fingerprints = None
+        self.mirror = None
 
-    module = AnsibleModule(
-            argument_spec=module_args,
-            supports_check_mode=True,
-            required_if=[
-              ["state", "present", ["name", "url"]],
-              ["state", "absent", ["name"]],
-              ["test_type", "TCP", ["port"]]
-            ]
-            )
+        # delete the undeclared tests matching exclusive_tag and
+        # exclusive_prefix, up to max_deletes
+        self.exclusive = False
+        self.exclusive_tag = None
+        self.exclusive_prefix = None
+        self.max_deletes = None
 
-    username = module.params['username']
-    api_key = module.params['api_key']
+        self.result = {
+            'changed': False,
+            'results': [],
+            'summary': {
+                'created': 0,
+                'updated': 0,
+                'deleted': 0,
+                'unchanged': 0
+            },
+            'diff': []
+        }
+
+    def reconcile(self):
+        # the account test list is not needed when every test is known to be
+        # up to date by its fingerprint
+        test_index = None
+        if self.exclusive or not all(self.up_to_date(params)
+                                     for params in self.tests):
+            test_index = UptimeIndex(
+                StatusCakeUptime.fetch_tests(self.client, self.cache))
+
+        undeclared = []
+        if self.exclusive:
+            undeclared = self.undeclared(test_index)
+            if self.max_deletes is not None and \
+                    len(undeclared) > self.max_deletes:
+                raise StatusCakeError(
+                    "exclusive would delete " + str(len(undeclared)) +
+                    " tests, more than max_deletes (" +
+                    str(self.max_deletes) + "): " +
+                    ", ".join(self.label(item) for item in undeclared))
+
+        # tests resolving to the same test are handled one after the other
+        # by the same worker, the others are independent
+        groups = {}
+        for index, params in enumerate(self.tests):
+            key = self.group_key(params, test_index)
+            groups.setdefault(key, []).append((index, params))
+
+        def process(group):
+            return [(index, self.process(params, test_index))
+                    for index, params in group]
+
+        try:
+            processed = run_concurrently(process, groups.values(),
+                                         self.concurrency)
+            pruned = run_concurrently(
+                lambda item: self.prune(item, test_index), undeclared,
+                self.concurrency)
+        finally:
+            if self.cache and self.changes:
+                self.cache.patch(self.changes, 'TestID')
+            if self.fingerprints:
+                self.fingerprints.save()
+
+        for index, (test, action) in sorted(
+                item for group in processed for item in group):
+            result = test.get_result()
+            if result['changed']:
+                self.result['changed'] = True
+                self.result['summary'][action] += 1
+            else:
+                self.result['summary']['unchanged'] += 1
+
+            self.result['results'].append(result)
+            self.result['diff'].append({
+                'before_header': test.label(),
+                'after_header': test.label(),
+                'before': result['diff']['before'],
+                'after': result['diff']['after']
+            })
+
+        if self.exclusive:
+            self.result['pruned'] = pruned
+            self.result['summary']['pruned'] = len(pruned)
+            for item, result in zip(undeclared, pruned):
+                self.result['changed'] = True
+                self.result['diff'].append({
+                    'before_header': result['name'],
+                    'after_header': result['name'],
+                    'before': item.to_dict(),
+                    'after': {}
+                })
+
+    # the test an item resolves to, by its TestID when it exists, else by
+    # the identifier find_test looks it up with (test_id, then name, then
+    # url), so that the items creating the same test share a worker too
+    @staticmethod
+    def group_key(params, test_index):
+        if test_index is not None:
+            item = test_index.find(params['test_id'], params['name'],
+                                   params['url'])
+            if item is not None:
+                return ('test_id', str(item['TestID']))
+        if params['test_id']:
+            return ('test_id', str(params['test_id']))
+        if params['name']:
+            return ('name', params['name'])
+        return ('url', params['url'])
+
+    # tests of the account within the exclusive scope that no item of tests
+    # matches
+    def undeclared(self, test_index):
+        declared = set()
+        for params in self.tests:
+            item = test_index.find(params['test_id'], params['name'],
+                                   params['url'])
+            if item is not None:
+                declared.add(str(item['TestID']))
+
+        if self.exclusive_tag:
+            candidates = test_index.tagged(self.exclusive_tag)
+        else:
+            candidates = test_index.tests()
+
+        undeclared = []
+        for item in candidates:
+            if str(item['TestID']) in declared:
+                continue
+            if self.exclusive_prefix and not str(
+                    item.get('WebsiteName') or '').startswith(
+                        self.exclusive_prefix):
+                continue
+            undeclared.append(item)
+        return sorted(undeclared, key=lambda item: item['TestID'])
+
+    @staticmethod
+    def label(item):
+        return "{0} ({1})".format(item.get('WebsiteName'), item['TestID'])
+
+    def test(self, params):
+        test = StatusCakeUptime(WorkerModule(self.module), self.username,
+                                self.api_key, **params)
+        test.client = self.client
+        test.trust_list = self.trust_list
+        test.changes = self.changes
+        test.details = self.details
+        test.fingerprints = self.fingerprints
+        test.mirror = self.mirror
+        return test
+
+    def up_to_date(self, params):
+        if not self.fingerprints or params['state'] != 'present':
+            return False
+        test = self.test(params)
+        return self.fingerprints.match(
+            test.fingerprint_key(), self.fingerprints.fingerprint(test.data))
+
+    # delete an undeclared test
+    def prune(self, item, test_index):
+        test_id = item['TestID']
+        result = {'changed': True,
+                  'name': item.get('WebsiteName'),
+                  'test_id': test_id,
+                  'state': 'absent',
+                  'response': ("This Check Has Been Deleted. " +
+                               "It can not be recovered.")}
+        if not self.module.check_mode:
+            response = self.client.delete(StatusCakeUptime.URL_DETAILS_TEST,
+                                          data={'TestID': test_id})
+            if not response.get('Success'):
+                raise StatusCakeError("Unable to delete test " +
+                                      self.label(item) + ": " +
+                                      str(response.get('Message')))
+            result['response'] = response.get('Message')
+            test_index.remove(item)
+            self.changes.append((test_id, None))
+            if self.fingerprints:
+                for key in StatusCakeUptime.fingerprint_keys(item):
+                    self.fingerprints.discard(key)
+        return result
+
+    def process(self, params, test_index):
+        test = self.test(params)
+        test.index = test_index
+        # without test_index, every test is up to date and exists
+        exists = test_index is None or test_index.find(
+            test.test_id, test.name, test.url) is not None
+
+        with timed_test(self.client.metrics, test.label()):
+            if test.state == "absent":
+                test.delete_test()
+                action = 'deleted'
+            else:
+                test.create_test()
+                action = 'updated' if exists else 'created'
+        return test, action
+
+    def get_result(self):
+        result = self.result
+        return result
+
+
+# Pause or unpause the tests matching a TestSelector, read from a single
+# account test list. Only the Paused field of the tests not already in the
+# target state is sent, concurrently.
+class StatusCakeUptimePause:
+
+    def __init__(self, module, username, api_key, paused, selector,
+                 cache=None, client=None):
+        self.client = client or StatusCakeClient(module, username, api_key)
+        self.module = module
+        self.paused = paused
+        self.selector = selector
+        self.cache = cache
+        self.changes = []
+        self.concurrency = 1
+        self.fingerprints = None
+        self.mirror = None
+
+        self.result = {
+            'changed': False,
+            'state': 'paused' if paused else 'unpaused',
+            'results': [],
+            'summary': {
+                'updated': 0,
+                'unchanged': 0
+            },
+            'diff': []
+        }
+
+    # tests matching the selector, from a fresh mirror when it has them
+    def matching_tests(self):
+        tests = None
+        if self.mirror:
+            tests = self.mirror.candidates(self.selector.filters, 'name',
+                                           'tag')
+        if tests is None:
+            tests = StatusCakeUptime.fetch_tests(self.client, self.cache)
+        return [item for item in tests if self.selector.match(item)]
+
+    def apply(self):
+        start = time.time()
+        tests = self.matching_tests()
+        pending = [item for item in tests
+                   if bool(item.get('Paused')) != self.paused]
+
+        try:
+            updated = run_concurrently(self.update, pending, self.concurrency)
+        finally:
+            if self.cache and self.changes:
+                self.cache.patch(self.changes, 'TestID')
+            if self.fingerprints:
+                self.fingerprints.save()
+
+        updated = dict((result['test_id'], result) for result in updated)
+        for item in tests:
+            result = updated.get(item['TestID'])
+            if result is None:
+                result = {'changed': False,
+                          'name': item.get('WebsiteName'),
+                          'test_id': item['TestID'],
+                          'response': "Already " + self.result['state']}
+            if result['changed']:
+                self.result['changed'] = True
+                self.result['summary']['updated'] += 1
+                self.result['diff'].append({
+                    'before_header': StatusCakeUptimeBulk.label(item),
+                    'after_header': StatusCakeUptimeBulk.label(item),
+                    'before': {'Paused': not self.paused},
+                    'after': {'Paused': self.paused}
+                })
+            else:
+                self.result['summary']['unchanged'] += 1
+            self.result['results'].append(result)
+        self.result['duration'] = round(time.time() - start, 3)
+
+    # send the Paused field of a test
+    def update(self, item):
+        test_id = item['TestID']
+        label = StatusCakeUptimeBulk.label(item)
+        result = {'changed': True,
+                  'name': item.get('WebsiteName'),
+                  'test_id': test_id,
+                  'response': "Test updated"}
+        if self.module.check_mode:
+            return result
+
+        with timed_test(self.client.metrics, label):
+            response = self.client.put(StatusCakeUptime.URL_UPDATE_TEST,
+                                       data={'TestID': test_id,
+                                             'Paused': int(self.paused)})
+        message = str(response.get('Message'))
+        if not response.get('Success'):
+            if not message.startswith('No data has been updated'):
+                raise StatusCakeError("Unable to update test " + label +
+                                      ": " + message)
+            result['changed'] = False
+        result['response'] = message
+        self.changes.append((test_id, {'Paused': self.paused}))
+        # the stored fingerprints no longer describe the test
+        if self.fingerprints and result['changed']:
+            for key in StatusCakeUptime.fingerprint_keys(item):
+                self.fingerprints.discard(key)
+        return result
+
+    def get_result(self):
+        result = self.result
+        return result
+
+
+# required parameters missing for the state of a test
+def missing_params(params):
+    return [" or ".join(group)
+            for group in REQUIRED_PARAMS.get(params['state'], [])
+            if not any(params[k] for k in group)]
+
+
+# build the parameters of every item of the tests option, using the module
+# level parameters as defaults and checking them as the module would do
+def bulk_params(module, module_args):
+    tests = []
+    defaults = dict((k, module.params[k]) for k in module_args
+                    if k not in ACCOUNT_PARAMS)
+
+    for item in module.params['tests']:
+        if not isinstance(item, dict):
+            module.fail_json(msg="Each item of tests must be a dictionary, " +
+                                 "got: " + str(item))
+
+        # the values of the no_log parameters of an item, such as
+        # basic_pass, are masked in the result as they are at the top level
+        for key, value in item.items():
+            if value and module_args.get(key, {}).get('no_log'):
+                module.no_log_values.add(value)
+
+        unsupported = [k for k in item if k not in defaults]
+        if unsupported:
+            module.fail_json(msg="Unsupported parameters for tests item " +
+                                 str(item.get('name')) + ": " +
+                                 ", ".join(sorted(unsupported)))
+
+        params = dict(defaults)
+        for key, value in item.items():
+            if value is not None and module_args[key].get('type') == 'int':
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    module.fail_json(msg="Value of " + key + " for tests " +
+                                         "item " + str(item.get('name')) +
+                                         " must be an integer")
+            elif key == 'state' and \
+                    value not in module_args['state']['choices']:
+                module.fail_json(msg="Value of state for tests item " +
+                                     str(item.get('name')) + " must be " +
+                                     "one of: " +
+                                     ", ".join(module_args['state']['choices']))
+            params[key] = value
+
+        if params['state'] in ('list', 'paused', 'unpaused'):
+            module.fail_json(msg="state=" + params['state'] + " is not " +
+                                 "supported for tests items")
+        missing = missing_params(params)
+        if missing:
+            module.fail_json(msg="state is " + params['state'] + " but the " +
+                                 "following are missing on tests item " +
+                                 str(params.get('name')) + ": " +
+                                 ", ".join(missing))
+        if params['test_type'] == 'TCP' and not params['port']:
+            module.fail_json(msg="test_type is TCP but port is missing on " +
+                                 "tests item " + str(params['name']))
+
+        tests.append(params)
+
+    return tests
+
+
+# manage the tests of an account and return the result of the task
+def account_result(module, module_args, username, api_key, metrics):
     name = module.params['name']
     url = module.params['url']
     state = module.params['state']
@@ -483,17 +1374,129 @@ def run_module():
     basic_user = module.params['basic_user']
     basic_pass = module.params['basic_pass']
 
-    if not (username and api_key) and \
-            os.environ.get('STATUSCAKE_USERNAME') and \
-            os.environ.get('STATUSCAKE_API_KEY'):
-        username = os.environ.get('STATUSCAKE_USERNAME')
-        api_key = os.environ.get('STATUSCAKE_API_KEY')
-    if not (username and api_key) and \
-            not (os.environ.get('STATUSCAKE_USERNAME') and \
-            os.environ.get('STATUSCAKE_API_KEY')):
-        module.fail_json(msg="You must set STATUSCAKE_USERNAME and " +
-                             "STATUSCAKE_API_KEY environment variables " +
-                             "or set username/api_key module arguments")
+    if module.params['offline']:
+        client = OfflineClient()
+    else:
+        client = StatusCakeClient(module,
+                                  username,
+                                  api_key,
+                                  module.params['connect_timeout'],
+                                  module.params['read_timeout'],
+                                  module.params['rate_limit'],
+                                  module.params['max_retries'])
+
+    if module.params['metrics']:
+        client.metrics = metrics
+
+    if module.params['mirror'] and not HAS_SQLITE:
+        module.fail_json(msg="The sqlite3 python module is required for " +
+                             "mirror")
+
+    # offline check mode reads the tests from a snapshot file or from the
+    # cached test list, whatever its age
+    cache = None
+    details = None
+    mirror = None
+    trust_list = module.params['trust_list']
+    try:
+        if module.params['mirror']:
+            mirror = StatusCakeMirror(module.params['mirror'],
+                                      None if module.params['offline'] else
+                                      module.params['cache_ttl'],
+                                      username,
+                                      'uptime')
+    except StatusCakeError as e:
+        module.fail_json(msg=str(e))
+
+    if module.params['offline']:
+        if not module.check_mode:
+            module.fail_json(msg="offline is only supported in check mode")
+        if module.params['snapshot']:
+            try:
+                snapshot = read_snapshot(module.params['snapshot'])
+            except StatusCakeError as e:
+                module.fail_json(msg=str(e))
+            cache = SnapshotCache(snapshot.get('uptime') or [], 'TestID')
+            details = cache
+        elif mirror:
+            cache = mirror
+            mirror = None
+            # the details missing from the mirror can't be downloaded
+            trust_list = True
+        elif module.params['cache_dir']:
+            cache = StatusCakeCache(module.params['cache_dir'],
+                                    None,
+                                    username,
+                                    StatusCakeUptime.URL_ALL_TESTS)
+            # the cached test list has no details
+            trust_list = True
+        else:
+            module.fail_json(msg="offline requires snapshot, mirror or " +
+                                 "cache_dir")
+    elif mirror:
+        cache = mirror
+    elif module.params['cache_dir']:
+        cache = StatusCakeCache(module.params['cache_dir'],
+                                module.params['cache_ttl'],
+                                username,
+                                StatusCakeUptime.URL_ALL_TESTS)
+    if cache:
+        cache.metrics = client.metrics
+
+    fingerprints = None
+    if module.params['fingerprint_ttl'] and not module.params['offline']:
+        if not module.params['cache_dir']:
+            module.fail_json(msg="fingerprint_ttl requires cache_dir")
+        fingerprints = FingerprintStore(module.params['cache_dir'],
+                                        module.params['fingerprint_ttl'],
+                                        username)
+
+    if module.params['tests']:
+        bulk = StatusCakeUptimeBulk(module,
+                                    username,
+                                    api_key,
+                                    bulk_params(module, module_args),
+                                    cache,
+                                    client)
+        bulk.trust_list = trust_list
+        bulk.details = details
+        bulk.fingerprints = fingerprints
+        bulk.mirror = mirror
+        bulk.exclusive = module.params['exclusive']
+        bulk.exclusive_tag = module.params['exclusive_tag']
+        bulk.exclusive_prefix = module.params['exclusive_prefix']
+        bulk.max_deletes = module.params['max_deletes']
+        bulk.concurrency = module.params['concurrency'] or 1
+        try:
+            bulk.reconcile()
+        except StatusCakeError as e:
+            module.fail_json(msg=str(e))
+        result = bulk.get_result()
+        result['api_calls'] = client.calls
+        result['throttled_time'] = round(client.throttled, 3)
+        return result
+
+    if state in ('paused', 'unpaused'):
+        try:
+            selector = TestSelector(module.params['filter'],
+                                    StatusCakeUptime.FILTERS)
+            pause = StatusCakeUptimePause(module,
+                                          username,
+                                          api_key,
+                                          state == 'paused',
+                                          selector,
+                                          cache,
+                                          client)
+            pause.fingerprints = fingerprints
+            pause.mirror = mirror
+            pause.concurrency = module.params['concurrency'] or 10
+            pause.apply()
+        except StatusCakeError as e:
+            module.fail_json(msg=str(e))
+        result = pause.get_result()
+        result['api_calls'] = client.calls
+        result['throttled_time'] = round(client.throttled, 3)
+        return result
 
     test = StatusCakeUptime(module,
                             username,
@@ -519,16 +1522,159 @@ def run_module():
                             post_raw,
                             trigger_rate,
                             basic_user,
-                            basic_pass)
+                            basic_pass,
+                            module.params['test_id'])
+    test.client = client
+    test.cache = cache
+    test.trust_list = trust_list
+    test.details = details
+    test.fingerprints = fingerprints
+    test.mirror = mirror
 
-    if state == "absent":
-        test.delete_test()
-    if state == "present":
-        test.create_test()
-    if state == "list":
-        test.get_all_tests()
+    try:
+        if state == "list":
+            test.selector = TestSelector(module.params['filter'],
+                                         test.FILTERS,
+                                         module.params['fields'],
+                                         module.params['limit'],
+                                         module.params['offset'])
+        if state == "absent":
+            with timed_test(client.metrics, test.label()):
+                test.delete_test()
+        if state == "present":
+            with timed_test(client.metrics, test.label()):
+                test.create_test()
+        if state == "list":
+            test.get_all_tests()
+        test.save_changes()
+        if fingerprints:
+            fingerprints.save()
+    except StatusCakeError as e:
+        module.fail_json(msg=str(e))
 
     result = test.get_result()
+    result['api_calls'] = client.calls
+    result['throttled_time'] = round(client.throttled, 3)
+    return result
+
+
+def run_module():
+    metrics = Metrics()
+
+    module_args = dict(
+        username=dict(type='str', required=False),
+        api_key=dict(type='str', required=False),
+        accounts=dict(type='raw', required=False),
+        account_concurrency=dict(type='int', required=False, default=10),
+        name=dict(type='str', required=False),
+        test_id=dict(type='int', required=False),
+        url=dict(type='str', required=False),
+        state=dict(choices=['absent', 'present', 'list', 'paused',
+                            'unpaused'], default='present'),
+        test_tags=dict(type='str', required=False),
+        check_rate=dict(type='int', required=False),
+        test_type=dict(type='str', required=False),
+        port=dict(type='int', required=False),
+        contact_group=dict(type='str', required=False),
+        paused=dict(type='int', required=False),
+        node_locations=dict(type='str', required=False),
+        confirmation=dict(type='int', required=False),
+        timeout=dict(type='int', required=False),
+        status_codes=dict(type='str', required=False),
+        host=dict(type='str', required=False),
+        custom_header=dict(type='str', required=False),
+        follow_redirect=dict(type='int', required=False),
+        find_string=dict(type='str', required=False),
+        do_not_find=dict(type='int', required=False),
+        post_raw=dict(type='str', required=False),
+        trigger_rate=dict(type='int', required=False),
+        basic_user=dict(type='str', required=False),
+        basic_pass=dict(type='str', required=False, no_log=True),
+        tests=dict(type='list', required=False),
+        cache_dir=dict(type='path', required=False),
+        cache_ttl=dict(type='int', required=False, default=300),
+        mirror=dict(type='path', required=False),
+        fingerprint_ttl=dict(type='int', required=False),
+        connect_timeout=dict(type='int', required=False, default=10),
+        read_timeout=dict(type='int', required=False, default=60),
+        trust_list=dict(type='bool', required=False, default=False),
+        concurrency=dict(type='int', required=False),
+        rate_limit=dict(type='float', required=False),
+        max_retries=dict(type='int', required=False, default=5),
+        filter=dict(type='dict', required=False),
+        fields=dict(type='list', required=False),
+        limit=dict(type='int', required=False),
+        offset=dict(type='int', required=False, default=0),
+        metrics=dict(type='bool', required=False, default=False),
+        offline=dict(type='bool', required=False, default=False),
+        snapshot=dict(type='path', required=False),
+        exclusive=dict(type='bool', required=False, default=False),
+        exclusive_tag=dict(type='str', required=False),
+        exclusive_prefix=dict(type='str', required=False),
+        max_deletes=dict(type='int', required=False, default=10),
+    )
+
+    module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True,
+            mutually_exclusive=[
+              ["tests", "name"],
+              ["tests", "test_id"],
+              ["accounts", "username"],
+              ["accounts", "api_key"]
+            ],
+            required_if=[
+              ["test_type", "TCP", ["port"]]
+            ]
+            )
+
+    if module.params['exclusive'] and not module.params['tests']:
+        module.fail_json(msg="exclusive requires tests")
+
+    # name and url are only required when a single test is managed
+    if not module.params['tests']:
+        missing = missing_params(module.params)
+        if missing:
+            module.fail_json(msg="state is " + module.params['state'] +
+                                 " but the following are missing: " +
+                                 ", ".join(missing))
+
+    if module.params['accounts']:
+        try:
+            accounts = account_credentials(module.params['accounts'])
+        except StatusCakeError as e:
+            module.fail_json(msg=str(e))
+        result = run_accounts(
+            lambda worker, username, api_key: account_result(
+                worker, module_args, username, api_key, metrics),
+            module, accounts, module.params['account_concurrency'])
+        if module.params['metrics']:
+            result['metrics'] = metrics.result()
+        if result['failed_accounts']:
+            module.fail_json(msg="Failed StatusCake accounts: " +
+                                 ", ".join(result['failed_accounts']),
+                             **result)
+        module.exit_json(**result)
+
+    username = module.params['username']
+    api_key = module.params['api_key']
+
+    if not (username and api_key) and \
+            os.environ.get('STATUSCAKE_USERNAME') and \
+            os.environ.get('STATUSCAKE_API_KEY'):
+        username = os.environ.get('STATUSCAKE_USERNAME')
+        api_key = os.environ.get('STATUSCAKE_API_KEY')
+    if not (username and api_key) and \
+            not (module.params['offline'] and module.params['snapshot']) and \
+            not (os.environ.get('STATUSCAKE_USERNAME') and \
+            os.environ.get('STATUSCAKE_API_KEY')):
+        module.fail_json(msg="You must set STATUSCAKE_USERNAME and " +
+                             "STATUSCAKE_API_KEY environment variables " +
+                             "or set username/api_key module arguments")
+
+    result = account_result(module, module_args, username, api_key, metrics)
+    if module.params['metrics']:
+        result['metrics'] = metrics.result()
     module.exit_json(**result)
 
 
@@ -0,0 +1,1463 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+import codecs
+import errno
+import fcntl
+import fnmatch
+import hashlib
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.module_utils.six import reraise, text_type
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+from ansible.module_utils.six.moves.urllib.parse import urlencode, urlparse
+from ansible.module_utils.urls import (ConnectionError, SSLValidationError,
+                                       open_url)
+
+try:
+    import sqlite3
+    HAS_SQLITE = True
+except ImportError:
+    HAS_SQLITE = False
+
+
+class StatusCakeError(Exception):
+    pass
+
+
+# response of open_url (or its HTTPError), read at once or by chunks. A
+# gzipped body is decompressed here unless open_url already did it, as
+# recent Ansible versions do.
+class Response:
+
+    GZIP_MAGIC = b'\x1f\x8b'
+
+    def __init__(self, raw, status_code, elapsed):
+        self.raw = raw
+        self.status_code = status_code
+        self.headers = raw.info()
+        # seconds spent until the response headers were received
+        self.elapsed = elapsed
+        self.content = None
+
+    def iter_content(self, chunk_size):
+        gzipped = (self.headers.get('Content-Encoding') or '').lower() == 'gzip'
+        decompressor = None
+        while True:
+            chunk = self.raw.read(chunk_size)
+            if not chunk:
+                break
+            if gzipped:
+                gzipped = False
+                if chunk.startswith(self.GZIP_MAGIC):
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            if chunk:
+                yield chunk
+        if decompressor:
+            chunk = decompressor.flush()
+            if chunk:
+                yield chunk
+
+    def read(self):
+        if self.content is None:
+            self.content = b''.join(self.iter_content(65536))
+        return self.content
+
+    def json(self):
+        return json.loads(to_text(self.read(), errors='surrogate_or_strict'))
+
+    def close(self):
+        self.raw.close()
+
+
+# form or query string of a request, without the fields set to None
+def urlencode_fields(fields):
+    return urlencode([(k, to_bytes(v) if isinstance(v, text_type) else v)
+                      for k, v in (fields or {}).items() if v is not None])
+
+
+# Token bucket of rate requests per second for an account. The bucket is
+# stored in a lock file, so every fork and thread using the same account on
+# this host shares it. Tokens are reserved before waiting, so that callers
+# are served in turn instead of polling the bucket. The lock file of the
+# shared temporary directory is private to the user: it is never opened
+# through a symlink nor when another user owns it.
+class RateLimiter:
+
+    def __init__(self, rate, username, path=None):
+        key = hashlib.sha1(username.encode('utf-8')).hexdigest()
+        self.rate = float(rate)
+        self.burst = max(1.0, self.rate)
+        self.path = path or os.path.join(
+            tempfile.gettempdir(),
+            "statuscake-ratelimit-{0}-{1}".format(os.getuid(), key))
+
+    def open(self):
+        try:
+            fd = os.open(self.path,
+                         os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        except (IOError, OSError) as e:
+            raise StatusCakeError("Unable to open the rate limit file " +
+                                  self.path + ": " + str(e))
+        if os.fstat(fd).st_uid != os.getuid():
+            os.close(fd)
+            raise StatusCakeError("The rate limit file " + self.path +
+                                  " is owned by another user")
+        return fd
+
+    # take a token and return the number of seconds waited for it
+    def acquire(self):
+        fd = self.open()
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = time.time()
+            try:
+                state = json.loads(os.read(fd, 1024).decode('utf-8'))
+                tokens = min(self.burst, state['tokens'] +
+                             (now - state['timestamp']) * self.rate)
+            except (ValueError, KeyError, TypeError):
+                tokens = self.burst
+
+            tokens -= 1
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, json.dumps({'tokens': tokens,
+                                     'timestamp': now}).encode('utf-8'))
+        finally:
+            os.close(fd)
+
+        wait = -tokens / self.rate if tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+# Performance metrics of a task: requests sent per endpoint with their time
+# and response size, time spent parsing JSON responses, cache lookups, time
+# spent on each test and runtime of the module. Shared by the threads of a
+# client.
+class Metrics:
+
+    SLOWEST_TESTS = 10
+
+    def __init__(self, start=None):
+        self.start = start or time.time()
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.parse_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.tests = []
+
+    def request(self, method, url, seconds, size):
+        endpoint = method + " " + urlparse(url).path
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, {'calls': 0,
+                                                         'time': 0.0,
+                                                         'bytes': 0,
+                                                         'times': []})
+            stats['calls'] += 1
+            stats['time'] += seconds
+            stats['bytes'] += size
+            stats['times'].append(round(seconds, 3))
+
+    def parse(self, seconds):
+        with self.lock:
+            self.parse_time += seconds
+
+    def test(self, label, seconds):
+        with self.lock:
+            self.tests.append((seconds, label))
+
+    def cache_lookup(self, hit):
+        with self.lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def result(self):
+        with self.lock:
+            endpoints = {}
+            for endpoint, stats in self.endpoints.items():
+                endpoints[endpoint] = {'calls': stats['calls'],
+                                       'time': round(stats['time'], 3),
+                                       'max_time': max(stats['times']),
+                                       'bytes': stats['bytes'],
+                                       'times': list(stats['times'])}
+            return {'runtime': round(time.time() - self.start, 3),
+                    'http_calls': sum(e['calls'] for e in endpoints.values()),
+                    'http_time': round(sum(s['time'] for s in
+                                           self.endpoints.values()), 3),
+                    'bytes': sum(e['bytes'] for e in endpoints.values()),
+                    'parse_time': round(self.parse_time, 3),
+                    'cache': {'hits': self.cache_hits,
+                              'misses': self.cache_misses},
+                    'endpoints': endpoints,
+                    'slowest_tests': [
+                        {'test': label, 'time': round(seconds, 3)}
+                        for seconds, label in sorted(
+                            self.tests, key=lambda t: -t[0])[
+                                :self.SLOWEST_TESTS]]}
+
+
+# time the block handling a test in metrics, if set
+@contextmanager
+def timed_test(metrics, label):
+    start = time.time()
+    try:
+        yield
+    finally:
+        if metrics:
+            metrics.test(label, time.time() - start)
+
+
+# Client of the StatusCake API, errors are raised as StatusCakeError. It can
+# be shared by several threads. Requests are sent with open_url, one
+# connection per request. Throttled requests (HTTP 429 and 503) are retried
+# after the Retry-After delay or a jittered exponential backoff, up to
+# max_retries times. Every request is recorded in metrics when set.
+class StatusCakeClient:
+
+    CHUNK_SIZE = 65536
+    BACKOFF_BASE = 1
+    BACKOFF_MAX = 60
+    THROTTLED_STATUS = (429, 503)
+    NETWORK_ERRORS = (URLError, socket.error, http_client.HTTPException,
+                      ConnectionError, SSLValidationError)
+
+    def __init__(self, module, username, api_key, connect_timeout=10,
+                 read_timeout=60, rate_limit=None, max_retries=5):
+        self.module = module
+        self.username = username
+        self.headers = {"Username": username, "API": api_key,
+                        "Accept-Encoding": "gzip"}
+        # open_url has a single socket timeout, used to connect and read
+        self.timeout = max(connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.limiter = None
+        if rate_limit:
+            self.limiter = RateLimiter(rate_limit, username)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0.0
+        self.metrics = None
+
+    def throttle(self, seconds):
+        with self.lock:
+            self.throttled += seconds
+
+    # delay asked by the Retry-After header, if given in seconds
+    @staticmethod
+    def retry_after(response):
+        try:
+            return max(0.0, float(response.headers.get('Retry-After')))
+        except (TypeError, ValueError):
+            return None
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.BACKOFF_MAX,
+                                     self.BACKOFF_BASE * 2 ** attempt))
+
+    def open(self, method, url, params=None, data=None):
+        headers = dict(self.headers)
+        if params:
+            url += "?" + urlencode_fields(params)
+        if data is not None:
+            data = to_bytes(urlencode_fields(data))
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        start = time.time()
+        try:
+            raw = open_url(url, data=data, headers=headers, method=method,
+                           timeout=self.timeout,
+                           http_agent="ansible-statuscake")
+            return Response(raw, raw.getcode(), time.time() - start)
+        except HTTPError as e:
+            return Response(e, e.code, time.time() - start)
+        except self.NETWORK_ERRORS as e:
+            raise StatusCakeError("{0} {1} failed: {2}".format(
+                method, url, str(e)))
+
+    # send a request, retrying it while it is throttled. The body of a
+    # streamed response is left to the caller.
+    def send(self, method, url, params=None, data=None, stream=False):
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                self.throttle(self.limiter.acquire())
+            with self.lock:
+                self.calls += 1
+            start = time.time()
+            response = self.open(method, url, params, data)
+
+            throttled = response.status_code in self.THROTTLED_STATUS
+            # a streamed response is recorded once it has been read
+            if throttled or not stream:
+                try:
+                    size = len(response.read())
+                except self.NETWORK_ERRORS + (zlib.error,) as e:
+                    raise StatusCakeError("{0} {1} failed: {2}".format(
+                        method, url, str(e)))
+                finally:
+                    response.close()
+                if self.metrics:
+                    self.metrics.request(method, url, time.time() - start,
+                                         size)
+            if not throttled:
+                break
+            if attempt == self.max_retries:
+                raise StatusCakeError(("{0} {1} is still throttled (HTTP "
+                                       "{2}) after {3} retries").format(
+                                           method, url, response.status_code,
+                                           self.max_retries))
+
+            wait = self.retry_after(response)
+            if wait is None:
+                wait = self.backoff(attempt)
+            time.sleep(wait)
+            self.throttle(wait)
+
+        return response
+
+    def request(self, method, url, **kwargs):
+        response = self.send(method, url, **kwargs)
+        start = time.time()
+        try:
+            return response.json()
+        except ValueError:
+            raise StatusCakeError(("{0} {1} returned an invalid JSON "
+                                   "response (HTTP {2})").format(
+                                       method, url, response.status_code))
+        finally:
+            if self.metrics:
+                self.metrics.parse(time.time() - start)
+
+    def get(self, url, params=None):
+        return self.request("GET", url, params=params)
+
+    # JSON list returned by url, an error object of the API is raised
+    # rather than returned, so that it is never cached
+    def get_list(self, url, params=None):
+        return check_list(url, self.get(url, params=params))
+
+    def put(self, url, data):
+        return self.request("PUT", url, data=data)
+
+    def delete(self, url, data=None, params=None):
+        return self.request("DELETE", url, data=data, params=params)
+
+    # iterate over the items of a JSON list returned by url, parsing the
+    # response as it is downloaded
+    def iter_list(self, url, params=None):
+        response = self.send("GET", url, params=params, stream=True)
+        # bytes and seconds spent downloading the response
+        received = [0, response.elapsed]
+        parsing = [0.0]
+
+        def chunks():
+            for chunk in timed(response.iter_content(self.CHUNK_SIZE),
+                               received, 1):
+                received[0] += len(chunk)
+                yield chunk
+
+        try:
+            body = chunks()
+            head = b''
+            for chunk in body:
+                head += chunk
+                if head.strip():
+                    break
+            # anything but a list is an error object of the API, read whole
+            # to report its message as get_list does
+            if not head.strip().startswith(b'['):
+                check_list(url, json.loads(to_text(
+                    head + b''.join(body), errors='surrogate_or_strict')))
+            for item in timed(iter_json_array(itertools.chain([head], body)),
+                              parsing, 0):
+                yield item
+        except ValueError as e:
+            raise StatusCakeError(("{0} returned an invalid JSON response "
+                                   "(HTTP {1}): {2}").format(
+                                       url, response.status_code, str(e)))
+        except self.NETWORK_ERRORS + (zlib.error,) as e:
+            raise StatusCakeError("GET {0} failed: {1}".format(url, str(e)))
+        finally:
+            response.close()
+            if self.metrics:
+                self.metrics.request("GET", url, received[1], received[0])
+                self.metrics.parse(parsing[0] - received[1] +
+                                   response.elapsed)
+
+
+# response of a list request, or StatusCakeError with the error message of
+# the API when it returned anything else, such as an authentication error
+def check_list(url, response):
+    if isinstance(response, list):
+        return response
+    if isinstance(response, dict):
+        message = response.get('Error') or response.get('Message')
+    else:
+        message = None
+    raise StatusCakeError("GET {0} did not return a list: {1}".format(
+        url, message or json.dumps(response)[:200]))
+
+
+# iterate over items, adding the time spent waiting for each item to
+# counter[index]
+def timed(items, counter, index):
+    items = iter(items)
+    while True:
+        start = time.time()
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        finally:
+            counter[index] += time.time() - start
+        yield item
+
+
+# convert the details of an uptime test returned by the API to the fields of
+# the update form, keeping only the given fields
+def convert_uptime_details(req_data, fields):
+    req_data['WebsiteURL'] = req_data.pop('URI', None)
+    req_data['TestTags'] = req_data.pop('Tags', None)
+    req_data['ContactGroup'] = (req_data['ContactGroups'][0]['ID']
+                                if req_data['ContactGroup'] else None)
+    req_data = ({k: req_data[k] for k in req_data.keys()
+                if k in fields})
+    return normalize_record(req_data)
+
+
+# values of a record as sent in the update form: lists are joined with commas
+# and booleans are sent as 0 or 1
+def normalize_record(req_data):
+    for key, value in list(req_data.items()):
+        if isinstance(value, list):
+            req_data[key] = ','.join(to_text(item) for item in value)
+        elif value is True:
+            req_data[key] = 1
+        elif value is False:
+            req_data[key] = 0
+    return req_data
+
+
+# Comparison of the fields of an update form. Every value is normalized by
+# the function of the kind of its field, chosen once per field: lists of
+# values are compared as sets, flags and numbers as integers and JSON
+# documents whatever their formatting. The other fields are compared as
+# text. The desired and current records are normalized once, then compared
+# value by value.
+class FieldSchema:
+
+    # kinds whose unset current value is their empty value rather than
+    # unknown
+    EMPTY_KINDS = ('groups',)
+
+    def __init__(self, kinds):
+        self.normalizers = dict((field, getattr(self, 'normalize_' + kind))
+                                for field, kind in kinds.items())
+        self.empty = dict((field, self.normalizers[field](None))
+                          for field, kind in kinds.items()
+                          if kind in self.EMPTY_KINDS)
+
+    @staticmethod
+    def normalize_text(value):
+        return to_text(value)
+
+    @staticmethod
+    def normalize_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            pass
+        try:
+            return int(boolean(value))
+        except TypeError:
+            return to_text(value)
+
+    @staticmethod
+    def normalize_set(value):
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            value = to_text(value).split(',')
+        return frozenset(item for item in
+                         (to_text(item).strip() for item in value) if item)
+
+    # contact groups, where no group is set as 0, left empty or returned as
+    # null
+    @staticmethod
+    def normalize_groups(value):
+        if value is None:
+            return frozenset()
+        return FieldSchema.normalize_set(value) - frozenset(['0'])
+
+    @staticmethod
+    def normalize_json(value):
+        if not isinstance(value, (dict, list)):
+            try:
+                value = json.loads(value)
+            except (TypeError, ValueError):
+                return to_text(value)
+        return json.dumps(value, sort_keys=True)
+
+    # normalized record, an unset desired value stays None so that it is
+    # ignored by diff
+    def normalize(self, record, current=False):
+        normalizers = self.normalizers
+        text = self.normalize_text
+        empty = self.empty if current else {}
+        return dict((k, empty.get(k) if v is None else
+                     normalizers.get(k, text)(v))
+                    for k, v in record.items())
+
+    # fields of a normalized desired record that differ from the normalized
+    # current record, the fields unset or unknown to current are ignored
+    @staticmethod
+    def diff(desired, current, ignored=()):
+        return [k for k, v in desired.items()
+                if v is not None and k in current and k not in ignored and
+                v != current[k]]
+
+
+UPTIME_SCHEMA = FieldSchema({'CheckRate': 'int',
+                             'ContactGroup': 'groups',
+                             'Confirmation': 'int',
+                             'CustomHeader': 'json',
+                             'DoNotFind': 'int',
+                             'FollowRedirect': 'int',
+                             'NodeLocations': 'set',
+                             'Paused': 'int',
+                             'Port': 'int',
+                             'PostRaw': 'json',
+                             'StatusCodes': 'set',
+                             'TestTags': 'set',
+                             'Timeout': 'int',
+                             'TriggerRate': 'int'})
+
+SSL_SCHEMA = FieldSchema({'alert_at': 'set',
+                          'alert_broken': 'int',
+                          'alert_expiry': 'int',
+                          'alert_mixed': 'int',
+                          'alert_reminder': 'int',
+                          'checkrate': 'int',
+                          'contact_groups': 'groups'})
+
+
+# fields of the update form of an SSL test, from a record of the account SSL
+# test list
+def convert_ssl_test(item):
+    # an SSL test without contact group has an empty or null list
+    groups = item.get('contact_groups') or [None]
+    return {"alert_at": item['alert_at'],
+            "alert_broken": item['alert_broken'],
+            "alert_expiry": item['alert_expiry'],
+            "alert_reminder": item['alert_reminder'],
+            "alert_mixed": item['alert_mixed'],
+            "contact_groups": groups[0],
+            "domain": item['domain'],
+            "id": item['id']}
+
+
+# File cache of a StatusCake test list, keyed by account and endpoint.
+# Entries are written atomically (temporary file + rename) and guarded by a
+# lock file, so the forks of a run can share them. Writes done by the modules
+# are applied to the cached entry instead of dropping it. Lookups are
+# recorded in metrics when set. Entries never expire when ttl is None.
+class StatusCakeCache:
+
+    def __init__(self, cache_dir, ttl, username, endpoint):
+        key = hashlib.sha1((username + " " + endpoint).encode('utf-8'))
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.path = os.path.join(cache_dir,
+                                 "statuscake-" + key.hexdigest() + ".json")
+        self.metrics = None
+
+        try:
+            os.makedirs(cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    @contextmanager
+    def lock(self, operation):
+        with open(self.path + ".lock", 'a') as lock:
+            fcntl.flock(lock, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if self.ttl is not None and \
+                time.time() - entry.get('timestamp', 0) > self.ttl:
+            return None
+        return entry
+
+    def write(self, data, timestamp):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir,
+                                        prefix=".statuscake-")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'timestamp': timestamp, 'data': data}, f)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self):
+        with self.lock(fcntl.LOCK_SH):
+            entry = self.read()
+        if self.metrics:
+            self.metrics.cache_lookup(entry is not None)
+        return entry['data'] if entry else None
+
+    def set(self, data):
+        with self.lock(fcntl.LOCK_EX):
+            self.write(data, time.time())
+
+    def invalidate(self):
+        with self.lock(fcntl.LOCK_EX):
+            try:
+                os.unlink(self.path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+    # apply (test id, fields) changes to the cached list: fields are merged
+    # into the record with this id, None removes it and a new id appends a
+    # record. A change without id can't be applied and drops the entry.
+    def patch(self, changes, key):
+        if any(test_id is None for test_id, fields in changes):
+            self.invalidate()
+            return
+
+        with self.lock(fcntl.LOCK_EX):
+            entry = self.read()
+            if not entry:
+                return
+
+            tests = entry['data']
+            index = dict((str(item[key]), item) for item in tests)
+            for test_id, fields in changes:
+                item = index.get(str(test_id))
+                if fields is None:
+                    index.pop(str(test_id), None)
+                elif item is not None:
+                    item.update((k, v) for k, v in fields.items() if k in item)
+                else:
+                    index[str(test_id)] = fields
+                    tests.append(fields)
+
+            self.write([item for item in tests
+                        if index.get(str(item[key])) is item],
+                       entry['timestamp'])
+
+
+# Local SQLite mirror of the test list of an account, used as its cache.
+# The tests are stored with their test details, by id and indexed by name,
+# url (the domain of an SSL test) and tag. When the mirror is older than
+# ttl seconds, the downloaded list is compared with it: only the new tests
+# and the tests whose list record changed are written, and their details
+# dropped, so the details are only downloaded again for them. Several
+# accounts and kinds of tests share the same database.
+class StatusCakeMirror:
+
+    # kind of tests -> (id field, name field, url field)
+    KINDS = {'uptime': ('TestID', 'WebsiteName', 'WebsiteURL'),
+             'ssl': ('id', 'domain', 'domain')}
+
+    SCHEMA = ("""CREATE TABLE IF NOT EXISTS tests (
+                   account TEXT, kind TEXT, id TEXT, position INTEGER,
+                   name TEXT, url TEXT, record TEXT, details TEXT,
+                   PRIMARY KEY (account, kind, id))""",
+              """CREATE INDEX IF NOT EXISTS tests_name
+                   ON tests (account, kind, name)""",
+              """CREATE INDEX IF NOT EXISTS tests_url
+                   ON tests (account, kind, url)""",
+              """CREATE TABLE IF NOT EXISTS tags (
+                   account TEXT, kind TEXT, id TEXT, tag TEXT)""",
+              """CREATE INDEX IF NOT EXISTS tags_tag
+                   ON tags (account, kind, tag)""",
+              """CREATE INDEX IF NOT EXISTS tags_id
+                   ON tags (account, kind, id)""",
+              """CREATE TABLE IF NOT EXISTS refreshes (
+                   account TEXT, kind TEXT, timestamp REAL,
+                   PRIMARY KEY (account, kind))""")
+
+    def __init__(self, path, ttl, username, kind):
+        self.ttl = ttl
+        self.account = (username, kind)
+        self.key, self.name_field, self.url_field = self.KINDS[kind]
+        self.metrics = None
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        try:
+            self.db = sqlite3.connect(path, timeout=60,
+                                      check_same_thread=False)
+            with self.db:
+                for statement in self.SCHEMA:
+                    self.db.execute(statement)
+        except sqlite3.Error as e:
+            raise StatusCakeError("Unable to open the mirror " + path +
+                                  ": " + str(e))
+
+    # query whose first parameters are the account and the kind
+    def execute(self, query, *params):
+        return self.db.execute(query, self.account + params)
+
+    def fresh(self):
+        row = self.execute("SELECT timestamp FROM refreshes "
+                           "WHERE account = ? AND kind = ?").fetchone()
+        return row is not None and \
+            (self.ttl is None or time.time() - row[0] <= self.ttl)
+
+    def get(self):
+        return self.query()
+
+    # tests of a fresh mirror that may match the filters of a TestSelector,
+    # looked up by the name glob pattern and the tag. A pattern with a
+    # character class is left to the selector, GLOB negates it differently.
+    def candidates(self, filters, name_filter, tag_filter=None):
+        name = filters.get(name_filter)
+        if name is not None and '[' in str(name):
+            name = None
+        tag = filters.get(tag_filter) if tag_filter else None
+        return self.query(None if name is None else str(name),
+                          None if tag is None else str(tag))
+
+    # tests of the mirror in list order, restricted to the tests whose name
+    # matches the glob pattern and having the tag when set, or None when
+    # the mirror must be refreshed first
+    def query(self, name=None, tag=None):
+        sql = "SELECT record FROM tests WHERE account = ? AND kind = ?"
+        params = ()
+        if name is not None:
+            sql += " AND name GLOB ?"
+            params += (name,)
+        if tag is not None:
+            sql += (" AND id IN (SELECT id FROM tags WHERE account = ? AND "
+                    "kind = ? AND tag = ?)")
+            params += self.account + (tag,)
+        sql += " ORDER BY position"
+
+        with self.lock:
+            tests = None
+            if self.fresh():
+                tests = [json.loads(record) for record,
+                         in self.execute(sql, *params)]
+        if self.metrics:
+            self.metrics.cache_lookup(tests is not None)
+        return tests
+
+    def write(self, position, item, test_id=None):
+        test_id = str(item[self.key]) if test_id is None else test_id
+        self.execute("INSERT OR REPLACE INTO tests (account, kind, id, "
+                     "position, name, url, record, details) VALUES "
+                     "(?, ?, ?, ?, ?, ?, ?, NULL)", test_id, position,
+                     item.get(self.name_field), item.get(self.url_field),
+                     json.dumps(item, sort_keys=True))
+        self.execute("DELETE FROM tags WHERE account = ? AND kind = ? AND "
+                     "id = ?", test_id)
+        self.db.executemany(
+            "INSERT INTO tags (account, kind, id, tag) VALUES (?, ?, ?, ?)",
+            [self.account + (test_id, tag)
+             for tag in split_tags(item.get('TestTags'))])
+
+    def remove(self, test_id):
+        for table in ('tests', 'tags'):
+            self.execute("DELETE FROM " + table + " WHERE account = ? AND "
+                         "kind = ? AND id = ?", test_id)
+
+    # incremental refresh with a downloaded test list
+    def set(self, data):
+        with self.lock, self.db:
+            current = dict(self.execute("SELECT id, record FROM tests "
+                                        "WHERE account = ? AND kind = ?"))
+            for position, item in enumerate(data):
+                test_id = str(item[self.key])
+                if current.pop(test_id, None) == json.dumps(item,
+                                                            sort_keys=True):
+                    self.db.execute("UPDATE tests SET position = ? WHERE "
+                                    "account = ? AND kind = ? AND id = ?",
+                                    (position,) + self.account + (test_id,))
+                else:
+                    self.write(position, item, test_id)
+            for test_id in current:
+                self.remove(test_id)
+            self.execute("INSERT OR REPLACE INTO refreshes (account, kind, "
+                         "timestamp) VALUES (?, ?, ?)", time.time())
+
+    def invalidate(self):
+        with self.lock, self.db:
+            self.execute("DELETE FROM refreshes WHERE account = ? AND "
+                         "kind = ?")
+
+    # apply (test id, fields) changes as StatusCakeCache.patch does, the
+    # details of the changed tests are dropped
+    def patch(self, changes, key):
+        if any(test_id is None for test_id, fields in changes):
+            self.invalidate()
+            return
+
+        with self.lock, self.db:
+            for test_id, fields in changes:
+                test_id = str(test_id)
+                row = self.execute("SELECT record FROM tests WHERE "
+                                   "account = ? AND kind = ? AND id = ?",
+                                   test_id).fetchone()
+                if fields is None:
+                    self.remove(test_id)
+                elif row is not None:
+                    item = json.loads(row[0])
+                    item.update((k, v) for k, v in fields.items()
+                                if k in item)
+                    position = self.execute(
+                        "SELECT position FROM tests WHERE account = ? AND "
+                        "kind = ? AND id = ?", test_id).fetchone()[0]
+                    self.write(position, item, test_id)
+                else:
+                    position = self.execute(
+                        "SELECT COALESCE(MAX(position) + 1, 0) FROM tests "
+                        "WHERE account = ? AND kind = ?").fetchone()[0]
+                    self.write(position, fields, test_id)
+
+    # stored test details of a test, None when they must be downloaded
+    def details(self, test_id):
+        with self.lock:
+            row = self.execute("SELECT details FROM tests WHERE account = ? "
+                               "AND kind = ? AND id = ?",
+                               str(test_id)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def set_details(self, test_id, details):
+        with self.lock, self.db:
+            self.db.execute("UPDATE tests SET details = ? WHERE account = ? "
+                            "AND kind = ? AND id = ?",
+                            (json.dumps(details),) + self.account +
+                            (str(test_id),))
+
+    def close(self):
+        self.db.close()
+
+
+# Fingerprints of the desired state of the tests, kept in cache_dir once a
+# test has been written or found up to date. A test whose desired state has
+# the same fingerprint as a stored one younger than ttl seconds is up to
+# date without reading it from the API. The updates are saved at once at
+# the end of the task.
+class FingerprintStore:
+
+    def __init__(self, cache_dir, ttl, username):
+        self.cache = StatusCakeCache(cache_dir, None, username,
+                                     "fingerprints")
+        self.ttl = ttl
+        self.entries = None
+        self.updates = {}
+
+    @staticmethod
+    def fingerprint(data):
+        fields = dict((k, to_text(v)) for k, v in data.items()
+                      if v is not None)
+        return hashlib.sha1(to_bytes(json.dumps(fields, sort_keys=True))) \
+            .hexdigest()
+
+    def match(self, key, fingerprint):
+        if self.entries is None:
+            self.entries = self.cache.get() or {}
+        entry = self.entries.get(key)
+        return entry is not None and \
+            entry['fingerprint'] == fingerprint and \
+            time.time() - entry['timestamp'] <= self.ttl
+
+    def set(self, key, fingerprint, test_id):
+        self.updates[key] = {'fingerprint': fingerprint,
+                             'test_id': test_id,
+                             'timestamp': time.time()}
+
+    def discard(self, key):
+        self.updates[key] = None
+
+    def save(self):
+        if not self.updates:
+            return
+        with self.cache.lock(fcntl.LOCK_EX):
+            entry = self.cache.read()
+            entries = entry['data'] if entry else {}
+            for key, value in self.updates.items():
+                if value is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = value
+            self.cache.write(entries, time.time())
+        self.updates = {}
+
+
+# Client of offline check mode, which must not send any request: the tests
+# come from a SnapshotCache or a StatusCakeCache instead.
+class OfflineClient:
+
+    def __init__(self):
+        self.calls = 0
+        self.throttled = 0.0
+        self.metrics = None
+
+    def request(self, method, url, **kwargs):
+        raise StatusCakeError("offline is set, the request " + method + " " +
+                              url + " can't be sent")
+
+    def get(self, url, params=None):
+        return self.request("GET", url)
+
+    def get_list(self, url, params=None):
+        return self.request("GET", url)
+
+    def put(self, url, data):
+        return self.request("PUT", url)
+
+    def delete(self, url, data=None, params=None):
+        return self.request("DELETE", url)
+
+    def iter_list(self, url, params=None):
+        return iter(self.request("GET", url))
+
+
+# format of a snapshot file, json or yaml, guessed from the extension when
+# snapshot_format is not given
+def get_snapshot_format(path, snapshot_format=None):
+    if not snapshot_format:
+        if path.endswith('.yml') or path.endswith('.yaml'):
+            snapshot_format = 'yaml'
+        else:
+            snapshot_format = 'json'
+    if snapshot_format == 'yaml':
+        import_yaml()
+    return snapshot_format
+
+
+# PyYAML, only imported for YAML snapshot files as it slows down the start
+# of every module
+def import_yaml():
+    try:
+        import yaml
+    except ImportError:
+        raise StatusCakeError("The PyYAML python library is required for " +
+                              "YAML snapshot files")
+    return yaml
+
+
+# content of a snapshot file written by statuscake_snapshot
+def dump_snapshot(snapshot, path, snapshot_format=None):
+    if get_snapshot_format(path, snapshot_format) == 'yaml':
+        return import_yaml().safe_dump(snapshot, default_flow_style=False)
+    return json.dumps(snapshot, indent=2, sort_keys=True) + "\n"
+
+
+# snapshot file written by statuscake_snapshot, in JSON or YAML
+def read_snapshot(path, snapshot_format=None):
+    snapshot_format = get_snapshot_format(path, snapshot_format)
+
+    try:
+        with open(path) as f:
+            if snapshot_format == 'yaml':
+                snapshot = import_yaml().safe_load(f)
+            else:
+                snapshot = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        raise StatusCakeError("Unable to read " + path + ": " + str(e))
+    if not isinstance(snapshot, dict):
+        raise StatusCakeError(path + " is not a snapshot file")
+    return snapshot
+
+
+# record of the account SSL test list from an SSL test of a snapshot file
+def ssl_list_item(record):
+    item = dict(record)
+    groups = record.get('contact_groups')
+    item['contact_groups'] = split_tags(str(groups)) \
+        if groups is not None else []
+    for key in ('alert_expiry', 'alert_reminder', 'alert_broken',
+                'alert_mixed'):
+        if record.get(key) is not None:
+            item[key] = boolean(record[key])
+    return item
+
+
+# Read only stand-in of StatusCakeCache serving the tests of a snapshot file,
+# for offline check mode. The snapshot records hold the normalized details of
+# the tests, returned by details() by the key field.
+class SnapshotCache:
+
+    def __init__(self, tests, key):
+        self.tests = tests
+        self.metrics = None
+        self.by_key = dict((str(item[key]), item) for item in tests)
+
+    def get(self):
+        return self.tests
+
+    def set(self, data):
+        pass
+
+    def patch(self, changes, key):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def details(self, test_id):
+        return self.by_key.get(str(test_id))
+
+
+# proxy of an AnsibleModule for the code run by worker threads: failures
+# are raised as StatusCakeError and reported by the main thread
+class WorkerModule:
+
+    def __init__(self, module):
+        self.module = module
+
+    def fail_json(self, **kwargs):
+        raise StatusCakeError(kwargs.get('msg'))
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+
+# call function for every item with up to concurrency threads and return the
+# results in the order of items. The first error found is raised again once
+# every item has been processed.
+def run_concurrently(function, items, concurrency):
+    items = list(items)
+    if concurrency <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+
+    results = [None] * len(items)
+    errors = [None] * len(items)
+    pending = iter(enumerate(items))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                try:
+                    index, item = next(pending)
+                except StopIteration:
+                    return
+            try:
+                results[index] = function(item)
+            except Exception:
+                errors[index] = sys.exc_info()
+
+    threads = [threading.Thread(target=worker)
+               for i in range(min(concurrency, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error:
+            reraise(*error)
+    return results
+
+
+# (name, username, api_key) of the accounts option, given as a list of
+# credentials (named by their username unless they have a name) or as a
+# mapping of names to credentials
+def account_credentials(accounts):
+    if isinstance(accounts, dict):
+        items = []
+        for name, credentials in sorted(accounts.items()):
+            if not isinstance(credentials, dict):
+                raise StatusCakeError("Credentials of account " + str(name) +
+                                      " must be a dictionary")
+            items.append(dict(credentials, name=name))
+    elif isinstance(accounts, list):
+        items = accounts
+    else:
+        raise StatusCakeError("accounts must be a list or a dictionary")
+
+    credentials = []
+    names = set()
+    for item in items:
+        if not isinstance(item, dict) or not item.get('username') or \
+                not item.get('api_key'):
+            raise StatusCakeError("Each account must have a username and " +
+                                  "an api_key")
+        name = str(item.get('name') or item['username'])
+        if name in names:
+            raise StatusCakeError("Several accounts are named " + name)
+        names.add(name)
+        credentials.append((name, item['username'], item['api_key']))
+    return credentials
+
+
+# run function(module, username, api_key) for every account with up to
+# concurrency threads, each with its own client, and merge their results:
+# results by account name, failed account names, whether any account
+# changed and the totals of the API usage and of the summaries
+def run_accounts(function, module, accounts, concurrency):
+    def run(account):
+        name, username, api_key = account
+        try:
+            return function(WorkerModule(module), username, api_key)
+        except StatusCakeError as e:
+            return {'failed': True, 'msg': str(e)}
+
+    results = run_concurrently(run, accounts, concurrency)
+
+    merged = {'changed': False,
+              'accounts': {},
+              'failed_accounts': [],
+              'api_calls': 0,
+              'throttled_time': 0.0}
+    for (name, username, api_key), result in zip(accounts, results):
+        merged['accounts'][name] = result
+        if result.get('failed'):
+            merged['failed_accounts'].append(name)
+        merged['changed'] = merged['changed'] or bool(result.get('changed'))
+        merged['api_calls'] += result.get('api_calls', 0)
+        merged['throttled_time'] += result.get('throttled_time', 0.0)
+        for key, count in result.get('summary', {}).items():
+            summary = merged.setdefault('summary', {})
+            summary[key] = summary.get(key, 0) + count
+    merged['throttled_time'] = round(merged['throttled_time'], 3)
+    return merged
+
+
+# tags of a test, given as a list or as a comma separated string
+def split_tags(tags):
+    if not tags:
+        return []
+    if not isinstance(tags, (list, tuple)):
+        tags = tags.split(',')
+    return [tag.strip() for tag in tags if tag.strip()]
+
+
+# shared copies of the values of the interned fields of the records
+INTERNED_VALUES = {}
+
+
+def intern_value(value):
+    try:
+        return INTERNED_VALUES.setdefault(value, value)
+    except TypeError:
+        return value
+
+
+# Compact record of a test list, read like the dict of the list it is built
+# from and turned back into it by to_dict. The FIELDS are kept in slots
+# rather than in a dict per record, lists as tuples, and the values of the
+# INTERNED fields and their lists are shared by every record. Unknown
+# fields are kept in the extra dict.
+class Record(object):
+
+    __slots__ = ('extra',)
+    FIELDS = ()
+    KEYS = frozenset()
+    INTERNED = frozenset()
+
+    def __init__(self, item):
+        self.extra = None
+        for key, value in item.items():
+            self[key] = value
+
+    def __setitem__(self, key, value):
+        if isinstance(value, list):
+            if key in self.INTERNED:
+                value = intern_value(tuple(intern_value(v) for v in value))
+            else:
+                value = tuple(value)
+        elif key in self.INTERNED:
+            value = intern_value(value)
+
+        if key in self.KEYS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __getitem__(self, key):
+        try:
+            if key in self.KEYS:
+                value = getattr(self, key)
+            else:
+                value = self.extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key)
+        return list(value) if isinstance(value, tuple) else value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key in self.KEYS:
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+
+    def keys(self):
+        keys = [key for key in self.FIELDS if hasattr(self, key)]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def update(self, fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def to_dict(self):
+        return dict(self.items())
+
+
+# record of the account test list of statuscake_uptime
+class UptimeRecord(Record):
+
+    __slots__ = FIELDS = ('TestID', 'Paused', 'TestType', 'WebsiteName',
+                          'WebsiteURL', 'ContactGroup', 'ContactID', 'Status',
+                          'Uptime', 'CheckRate', 'Public',
+                          'NormalisedResponse', 'TestTags')
+    KEYS = frozenset(FIELDS)
+    INTERNED = frozenset(('TestType', 'Status', 'ContactGroup', 'TestTags'))
+
+
+# record of the account SSL test list of statuscake_ssl
+class SSLRecord(Record):
+
+    __slots__ = FIELDS = ('id', 'checktype', 'domain', 'checkrate',
+                          'contact_groups', 'alert_at', 'alert_reminder',
+                          'alert_expiry', 'alert_broken', 'alert_mixed',
+                          'paused', 'issuer_cn', 'cert_score',
+                          'cipher_score', 'cert_status', 'cipher',
+                          'valid_from_utc', 'valid_until_utc',
+                          'mixed_content', 'flags', 'last_reminder',
+                          'last_updated_utc')
+    KEYS = frozenset(FIELDS)
+    INTERNED = frozenset(('checktype', 'alert_at', 'contact_groups',
+                          'issuer_cn', 'cert_status', 'cipher'))
+
+
+# Index of an uptime test list by TestID, WebsiteName, WebsiteURL and tag,
+# built once per fetched list. Names, URLs and tags can be shared by several
+# tests, their lookups return every matching record in list order.
+class UptimeIndex:
+
+    def __init__(self, tests):
+        self.lock = threading.RLock()
+        self.by_id = {}
+        self.by_name = {}
+        self.by_url = {}
+        self.by_tag = {}
+        for item in tests:
+            self.add(item)
+
+    def add(self, item):
+        with self.lock:
+            self.by_id[str(item['TestID'])] = item
+            self.by_name.setdefault(item.get('WebsiteName'), []).append(item)
+            self.by_url.setdefault(item.get('WebsiteURL'), []).append(item)
+            for tag in split_tags(item.get('TestTags')):
+                self.by_tag.setdefault(tag, []).append(item)
+
+    def remove(self, item):
+        with self.lock:
+            self.by_id.pop(str(item['TestID']), None)
+            for index, key in ((self.by_name, item.get('WebsiteName')),
+                               (self.by_url, item.get('WebsiteURL'))):
+                self.discard(index, key, item)
+            for tag in split_tags(item.get('TestTags')):
+                self.discard(self.by_tag, tag, item)
+
+    @staticmethod
+    def discard(index, key, item):
+        items = [i for i in index.get(key, []) if i is not item]
+        if items:
+            index[key] = items
+        else:
+            index.pop(key, None)
+
+    # merge fields into a record, keeping the index up to date
+    def update(self, item, fields):
+        with self.lock:
+            self.remove(item)
+            item.update(fields)
+            self.add(item)
+
+    def find(self, test_id=None, name=None, url=None):
+        with self.lock:
+            if test_id:
+                return self.by_id.get(str(test_id))
+            if name:
+                items = self.by_name.get(name)
+            else:
+                items = self.by_url.get(url)
+            return items[0] if items else None
+
+    def named(self, name):
+        with self.lock:
+            return list(self.by_name.get(name, []))
+
+    def tagged(self, tag):
+        with self.lock:
+            return list(self.by_tag.get(tag, []))
+
+    def tests(self):
+        with self.lock:
+            return list(self.by_id.values())
+
+
+# iterate over the items of a JSON array given as chunks of UTF-8 bytes,
+# holding in memory only the item being parsed
+def iter_json_array(chunks):
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    started = False
+
+    # the last pass, with chunk None, parses what is left once the stream is
+    # exhausted
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        buf += utf8.decode(b'' if final else chunk, final)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buf):
+                break
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError("expected a JSON list")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # incomplete item, wait for the next chunk
+                break
+            # a number is only complete once followed by a delimiter, it may
+            # go on in the next chunk ("1" then "23", "-4500" then ".0")
+            if not final and not isinstance(item, (dict, list, text_type)) \
+                    and (end == len(buf) or buf[end] not in ' \t\r\n,]'):
+                break
+            pos = end
+            yield item
+        buf = buf[pos:]
+
+    if not started or buf.strip():
+        raise ValueError("truncated JSON list")
+
+
+# Selection of the tests of a list. filters maps a filter name to a value,
+# spec maps every supported filter name to the (field, kind) it applies to:
+# glob matches the field with a shell pattern, tag looks for the value in
+# the tags of the field, bool and equal compare the field with the value.
+class TestSelector:
+
+    def __init__(self, filters, spec, fields=None, limit=None, offset=0):
+        self.filters = filters or {}
+        self.matchers = []
+        self.fields = fields
+        self.limit = limit
+        self.offset = offset or 0
+
+        for key, value in (filters or {}).items():
+            if key not in spec:
+                raise StatusCakeError("Unsupported filter " + key + ", " +
+                                      "supported filters are: " +
+                                      ", ".join(sorted(spec)))
+            field, kind = spec[key]
+            self.matchers.append(self.matcher(field, kind, value))
+
+    @staticmethod
+    def matcher(field, kind, value):
+        if kind == 'glob':
+            return lambda item: fnmatch.fnmatchcase(
+                str(item.get(field) or ''), str(value))
+        if kind == 'tag':
+            return lambda item: str(value) in split_tags(item.get(field))
+        if kind == 'bool':
+            value = boolean(value)
+            return lambda item: bool(item.get(field)) == value
+        return lambda item: str(item.get(field)).lower() == str(value).lower()
+
+    def match(self, item):
+        return all(matcher(item) for matcher in self.matchers)
+
+    def project(self, item):
+        if not self.fields:
+            return item.to_dict() if isinstance(item, Record) else item
+        return dict((k, item[k]) for k in self.fields if k in item)
+
+    # return the selected and projected tests and the number of matching
+    # tests, keeping only the selected ones in memory
+    def select(self, tests):
+        selected = []
+        matched = 0
+        for item in tests:
+            if not self.match(item):
+                continue
+            if matched >= self.offset and \
+                    (self.limit is None or len(selected) < self.limit):
+                selected.append(self.project(item))
+            matched += 1
+        return selected, matched
@@ -0,0 +1,84 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+# Unit tests of the role, run with: python -m pytest tests
+# Requires ansible. The modules import ansible.module_utils.statuscake, which
+# is found in the module_utils directory of the role.
+
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import threading
+
+import ansible.module_utils
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ansible.module_utils.__path__.append(os.path.join(ROOT, 'module_utils'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from ansible.module_utils import basic  # noqa: E402
+from ansible.module_utils._text import to_bytes  # noqa: E402
+from fake_api import FakeStatusCake  # noqa: E402
+
+
+def load_module(name):
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(ROOT, 'library', name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# FakeStatusCake of a small account served on a local port, with the URLs of
+# statuscake_uptime and statuscake_ssl pointing to it
+@pytest.fixture
+def fake_api(monkeypatch):
+    api = FakeStatusCake(tests=5, ssl_tests=1)
+    server = api.server()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    url = "http://127.0.0.1:{0}".format(server.server_address[1])
+    uptime = load_module('statuscake_uptime')
+    for name, path in (('URL_ALL_TESTS', '/API/Tests'),
+                       ('URL_DETAILS_TEST', '/API/Tests/Details'),
+                       ('URL_UPDATE_TEST', '/API/Tests/Update')):
+        monkeypatch.setattr(uptime.StatusCakeUptime, name, url + path)
+    api.uptime_module = uptime
+
+    ssl = load_module('statuscake_ssl')
+    for name, path in (('URL_ALL_TESTS', '/API/SSL'),
+                       ('URL_UPDATE_TEST', '/API/SSL/Update')):
+        monkeypatch.setattr(ssl.StatusCakeSSL, name, url + path)
+    api.ssl_module = ssl
+    yield api
+    server.shutdown()
+    server.server_close()
+
+
+# result of a module run with args
+def run_module(module, args):
+    args = dict(args, username='user', api_key='key')
+    basic._ANSIBLE_ARGS = to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': args}))
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        with pytest.raises(SystemExit):
+            module.run_module()
+    return json.loads(output.getvalue())
@@ -0,0 +1,35 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+from conftest import run_module
+
+
+def test_basic_pass_change_is_sent(fake_api):
+    protected = {'name': 'protected', 'url': 'https://protected.example.com',
+                 'basic_user': 'admin', 'basic_pass': 'first'}
+    result = run_module(fake_api.uptime_module, protected)
+    assert result['changed']
+    test_id = [test['TestID'] for test in fake_api.tests.values()
+               if test['WebsiteName'] == 'protected'][0]
+
+    # only the write-only password differs from the account
+    result = run_module(fake_api.uptime_module,
+                        dict(protected, basic_pass='second'))
+    assert result['changed']
+    assert fake_api.passwords[test_id] == 'second'
+
+    result = run_module(fake_api.uptime_module,
+                        dict(protected, basic_pass='second'))
+    assert not result['changed']
@@ -0,0 +1,65 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+from conftest import run_module
+
+
+def test_basic_pass_of_tests_items_is_masked(fake_api):
+    result = run_module(fake_api.uptime_module,
+                        {'tests': [{'name': 'protected',
+                                    'url': 'https://protected.example.com',
+                                    'basic_user': 'admin',
+                                    'basic_pass': 'S3CRET-PW'}]})
+    assert result['changed']
+    assert 'S3CRET-PW' not in json.dumps(result)
+
+
+def test_items_of_the_same_test_share_a_worker(fake_api):
+    existing = list(fake_api.tests.values())[0]
+    result = run_module(fake_api.uptime_module,
+                        {'concurrency': 4,
+                         'tests': [{'name': 'shared',
+                                    'url': 'https://one.example.com'},
+                                   {'name': 'shared',
+                                    'url': 'https://two.example.com'},
+                                   {'test_id': existing['TestID'],
+                                    'url': existing['URI'],
+                                    'check_rate': 600},
+                                   {'name': existing['WebsiteName'],
+                                    'url': existing['URI'],
+                                    'check_rate': 900}]})
+    assert result['summary']['created'] == 1
+    assert [test['URI'] for test in fake_api.tests.values()
+            if test['WebsiteName'] == 'shared'] == ['https://two.example.com']
+    assert existing['CheckRate'] == 900
+
+
+def test_exclusive_tag_prunes_only_tagged_tests(fake_api):
+    untagged = run_module(fake_api.uptime_module,
+                          {'name': 'untagged',
+                           'url': 'https://untagged.example.com'})
+    assert untagged['changed']
+
+    declared = [{'name': test['WebsiteName'], 'url': test['URI']}
+                for test in list(fake_api.tests.values())[:3]]
+    result = run_module(fake_api.uptime_module,
+                        {'exclusive': True, 'exclusive_tag': 'bench',
+                         'tests': declared})
+    assert sorted(item['name'] for item in result['pruned']) == \
+        ['bench-3', 'bench-4']
+    assert [test['WebsiteName'] for test in fake_api.tests.values()] == \
+        ['bench-0', 'bench-1', 'bench-2', 'untagged']
@@ -0,0 +1,91 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from ansible.module_utils.statuscake import (SSL_SCHEMA, UPTIME_SCHEMA,
+                                              convert_ssl_test,
+                                              ssl_list_item)
+
+from conftest import run_module
+
+
+@pytest.mark.parametrize('current', [None, '', [], '0'])
+def test_no_contact_group(current):
+    desired = UPTIME_SCHEMA.normalize({'ContactGroup': '0'})
+    current = UPTIME_SCHEMA.normalize({'ContactGroup': current}, True)
+    assert UPTIME_SCHEMA.diff(desired, current) == []
+
+
+def test_unset_contact_group_is_ignored():
+    desired = UPTIME_SCHEMA.normalize({'ContactGroup': None})
+    current = UPTIME_SCHEMA.normalize({'ContactGroup': '1234'}, True)
+    assert UPTIME_SCHEMA.diff(desired, current) == []
+
+
+@pytest.mark.parametrize('groups', [[], None])
+def test_ungrouped_ssl_test(groups):
+    record = convert_ssl_test({'id': '1', 'domain': 'https://example.com',
+                               'contact_groups': groups, 'alert_at': '1,7',
+                               'alert_expiry': True, 'alert_reminder': True,
+                               'alert_broken': True, 'alert_mixed': True})
+    assert record['contact_groups'] is None
+    desired = SSL_SCHEMA.normalize({'contact_groups': '0'})
+    current = SSL_SCHEMA.normalize(record, True)
+    assert SSL_SCHEMA.diff(desired, current) == []
+
+
+def test_ungrouped_ssl_snapshot_record():
+    item = ssl_list_item({'domain': 'https://example.com',
+                          'contact_groups': None})
+    assert item['contact_groups'] == []
+
+
+def test_ungrouped_ssl_test_gets_a_group(fake_api):
+    # contact_group is required by the module, the test was created elsewhere
+    fake_api.add_ssl({'domain': 'https://ungrouped.example.com'})
+    present = {'domain': 'https://ungrouped.example.com',
+               'contact_group': '1'}
+
+    result = run_module(fake_api.ssl_module, present)
+    assert result['changed']
+    assert result['diff']['after'] == {'contact_groups': 1}
+    assert not run_module(fake_api.ssl_module, present)['changed']
+
+
+def test_ungrouped_test_is_up_to_date(fake_api):
+    present = {'name': 'ungrouped', 'url': 'https://ungrouped.example.com',
+               'contact_group': '0', 'confirmation': 2}
+
+    assert run_module(fake_api.uptime_module, present)['changed']
+    for _ in range(2):
+        result = run_module(fake_api.uptime_module, present)
+        assert not result['changed']
+        assert result['diff'] == {'before': {}, 'after': {}}
+
+
+def test_tags_are_compared_with_the_test_list(fake_api):
+    tagged = {'name': 'tagged', 'url': 'https://tagged.example.com',
+              'test_tags': 'web, production'}
+    assert run_module(fake_api.uptime_module, tagged)['changed']
+
+    fake_api.reset()
+    assert not run_module(fake_api.uptime_module, tagged)['changed']
+    assert fake_api.calls['GET /API/Tests/Details'] == 0
+
+    result = run_module(fake_api.uptime_module,
+                        dict(tagged, test_tags='web'))
+    assert result['changed']
+    assert result['diff']['after'] == {'TestTags': 'web'}
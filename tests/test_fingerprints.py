@@ -0,0 +1,51 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from conftest import run_module
+
+
+def named(api, name):
+    return [test for test in api.tests.values()
+            if test['WebsiteName'] == name]
+
+
+@pytest.mark.parametrize('lookup', [{'name': 'fp'},
+                                    {'url': 'https://fp.example.com'},
+                                    'test_id'])
+def test_delete_then_recreate(fake_api, tmp_path, lookup):
+    options = {'cache_dir': str(tmp_path), 'fingerprint_ttl': 3600}
+    present = dict(options, name='fp', url='https://fp.example.com')
+
+    result = run_module(fake_api.uptime_module, present)
+    assert result['changed']
+    test_id = named(fake_api, 'fp')[0]['TestID']
+
+    # up to date by its fingerprint
+    result = run_module(fake_api.uptime_module, present)
+    assert not result['changed']
+    assert result['api_calls'] == 0
+
+    if lookup == 'test_id':
+        lookup = {'test_id': test_id}
+    result = run_module(fake_api.uptime_module,
+                        dict(options, state='absent', **lookup))
+    assert result['changed']
+    assert named(fake_api, 'fp') == []
+
+    result = run_module(fake_api.uptime_module, present)
+    assert result['changed']
+    assert len(named(fake_api, 'fp')) == 1
@@ -0,0 +1,63 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+import pytest
+
+from ansible.module_utils.statuscake import iter_json_array
+
+from conftest import run_module
+
+
+# the document split into chunks of size bytes
+def chunked(document, size):
+    data = document.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_number_split_across_chunks():
+    assert list(iter_json_array([b'[1', b'23, 4', b'5]'])) == [123, 45]
+
+
+def test_number_at_the_end_of_a_chunk():
+    assert list(iter_json_array([b'[7, 1', b'2', b']'])) == [7, 12]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64])
+def test_every_chunk_boundary(size):
+    items = [123, -4.5e3, "café ]", {"TestID": 42, "Tags": ["a", "b"]},
+             [1, [2]], True, None, 6789]
+    document = json.dumps(items)
+    assert list(iter_json_array(chunked(document, size))) == items
+
+
+def test_truncated_list():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[1, 2, {"a"']))
+
+
+def test_not_a_list():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"ErrNo": 0}']))
+
+
+def test_streamed_list_error_message(fake_api, monkeypatch):
+    # the details of an unknown test are an error object, not a list
+    uptime = fake_api.uptime_module.StatusCakeUptime
+    monkeypatch.setattr(uptime, 'URL_ALL_TESTS', uptime.URL_DETAILS_TEST)
+    result = run_module(fake_api.uptime_module, {'state': 'list'})
+    assert result['failed']
+    assert result['msg'].endswith('did not return a list: No results found')
@@ -0,0 +1,70 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+import pytest
+
+from conftest import load_module, run_module
+
+
+@pytest.fixture
+def snapshot_module(fake_api, monkeypatch):
+    module = load_module('statuscake_snapshot')
+    url = fake_api.uptime_module.StatusCakeUptime.URL_ALL_TESTS[
+        :-len('/API/Tests')]
+    for name, path in (('URL_ALL_TESTS', '/API/Tests'),
+                       ('URL_DETAILS_TEST', '/API/Tests/Details'),
+                       ('URL_UPDATE_TEST', '/API/Tests/Update'),
+                       ('URL_ALL_SSL', '/API/SSL'),
+                       ('URL_UPDATE_SSL', '/API/SSL/Update')):
+        monkeypatch.setattr(module.StatusCakeSnapshot, name, url + path)
+    return module
+
+
+def desired_file(tmp_path, snapshot):
+    path = tmp_path / 'desired.json'
+    path.write_text(json.dumps(snapshot))
+    return str(path)
+
+
+def test_missing_kind_is_left_untouched(fake_api, snapshot_module,
+                                        tmp_path):
+    uptime = [{'TestID': test['TestID'], 'WebsiteName': test['WebsiteName'],
+               'WebsiteURL': test['URI']} for test in fake_api.tests.values()]
+    result = run_module(snapshot_module,
+                        {'state': 'apply',
+                         'desired': desired_file(tmp_path,
+                                                 {'uptime': uptime})})
+    assert not result['changed']
+    assert 'ssl' not in result['plan']
+    assert len(fake_api.ssl) == 1
+
+
+def test_max_deletes(fake_api, snapshot_module, tmp_path):
+    desired = desired_file(tmp_path, {'uptime': [], 'ssl': []})
+    result = run_module(snapshot_module, {'state': 'apply',
+                                          'desired': desired,
+                                          'max_deletes': 5})
+    assert result['failed']
+    assert 'more than max_deletes (5)' in result['msg']
+    assert len(fake_api.tests) == 5
+
+    result = run_module(snapshot_module, {'state': 'apply',
+                                          'desired': desired,
+                                          'max_deletes': 6})
+    assert result['changed']
+    assert result['summary']['uptime']['delete'] == 5
+    assert fake_api.tests == {} and fake_api.ssl == {}
@@ -0,0 +1,40 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+from conftest import run_module
+
+DOMAIN = 'https://repeated.example.com'
+
+
+def with_domain(api):
+    return [test for test in api.ssl.values() if test['domain'] == DOMAIN]
+
+
+def test_repeated_domain_is_created_once(fake_api):
+    result = run_module(fake_api.ssl_module,
+                        {'contact_group': '1',
+                         'tests': [{'domain': DOMAIN}, {'domain': DOMAIN}]})
+    assert result['summary']['created'] == 1
+    assert len(with_domain(fake_api)) == 1
+
+
+def test_created_test_can_be_deleted_by_a_later_item(fake_api):
+    result = run_module(fake_api.ssl_module,
+                        {'contact_group': '1',
+                         'tests': [{'domain': DOMAIN},
+                                   {'domain': DOMAIN, 'state': 'absent'}]})
+    assert result['summary']['created'] == 1
+    assert result['summary']['deleted'] == 1
+    assert with_domain(fake_api) == []